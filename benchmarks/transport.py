@@ -0,0 +1,122 @@
+"""Per-request overhead of the default httpx.Client against build_http_client, on a local keep-alive server.
+
+Run with `python -m benchmarks.transport [--workers 24] [--requests 1500] [--latency-ms 100] [--handshake-ms 30]`.
+The server answers every request after `--latency-ms`, like the Notion API would, and holds every new connection
+for `--handshake-ms` as a stand-in for the TCP and TLS setup of a real connection to api.notion.com. The mean
+latency above `--latency-ms` is the overhead of the client, mostly handshakes of connections it failed to reuse.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import httpx
+
+from cached_notion.transport import HTTPOptions, build_http_client
+
+_BODY = json.dumps({"object": "page", "id": "0" * 32, "properties": {}}).encode()
+_RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(_BODY), _BODY)
+
+
+def _serve(port, connections, latency: float, handshake: float) -> None:
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Small keep-alive responses would otherwise wait on Nagle's algorithm
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with connections.get_lock():
+            connections.value += 1
+        await asyncio.sleep(handshake)
+        try:
+            while True:
+                await reader.readuntil(b"\r\n\r\n")
+                await asyncio.sleep(latency)
+                writer.write(_RESPONSE)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        writer.close()
+
+    async def main() -> None:
+        server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=1024)
+        port.value = server.sockets[0].getsockname()[1]
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+class Server:
+    """An asyncio keep-alive server in its own process, so that it doesn't compete with the client for the GIL."""
+
+    def __init__(self, latency: float = 0.0, handshake: float = 0.0) -> None:
+        self.port = multiprocessing.Value("i", 0)
+        self.connections = multiprocessing.Value("i", 0)
+        self.process = multiprocessing.Process(target=_serve, daemon=True,
+                                               args=(self.port, self.connections, latency, handshake))
+        self.process.start()
+        while not self.port.value:
+            time.sleep(0.01)
+        self.url = f"http://127.0.0.1:{self.port.value}/v1/pages/abc"
+
+    def close(self) -> None:
+        self.process.terminate()
+        self.process.join()
+
+
+def run(server: Server, make_client: Callable[[], httpx.Client], workers: int, requests: int) -> Dict[str, float]:
+    """Latencies, throughput, connections opened and failed requests for `requests` GETs over `workers` threads."""
+
+    def get(client: httpx.Client) -> Optional[float]:
+        start = time.perf_counter()
+        try:
+            client.get(server.url).raise_for_status()
+        except httpx.HTTPError:
+            return None
+        return time.perf_counter() - start
+
+    with make_client() as client:
+        get(client)
+        server.connections.value = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(workers) as executor:
+            results = list(executor.map(lambda _: get(client), range(requests)))
+        elapsed = time.perf_counter() - start
+    latencies = sorted(latency for latency in results if latency is not None)
+    return {
+        "mean_ms": sum(latencies) / len(latencies) * 1e3,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1e3,
+        "requests_per_s": requests / elapsed,
+        "connections": server.connections.value,
+        "errors": requests - len(latencies),
+    }
+
+
+def main() -> Dict[str, Dict[str, float]]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=24)
+    parser.add_argument("--requests", type=int, default=1500)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--handshake-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    server = Server(args.latency_ms / 1000, args.handshake_ms / 1000)
+    clients = {
+        "httpx.Client()": httpx.Client,
+        "build_http_client(HTTPOptions())": lambda: build_http_client(HTTPOptions()),
+    }
+    results = {}
+    try:
+        for name, make_client in clients.items():
+            results[name] = result = run(server, make_client, args.workers, args.requests)
+            print(f"{name:34} mean {result['mean_ms']:6.1f} ms  p99 {result['p99_ms']:6.1f} ms  "
+                  f"{result['requests_per_s']:5.0f} req/s  {result['connections']:5} connections  "
+                  f"{result['errors']} errors")
+    finally:
+        server.close()
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,215 @@
-from datetime import datetime
-from functools import wraps
-from typing import Any, Dict, Optional, TYPE_CHECKING
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from functools import partial, wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING, Union
 
 from notion_client.api_endpoints import BlocksEndpoint, Endpoint, PagesEndpoint, DatabasesEndpoint, \
     BlocksChildrenEndpoint
-from notion_client.helpers import collect_paginated_api
+from notion_client.errors import APIErrorCode, APIResponseError
 from notion_client.typing import SyncAsync
-from tenacity import retry, wait_exponential, stop_after_attempt
+
+from cached_notion.local_query import UnsupportedFilterError
+from cached_notion.objects import get_parent_id, is_removed
 
 if TYPE_CHECKING:
     from .cached_client import CachedClient
 
 
+def to_timedelta(delta: Optional[Union[timedelta, int]], default: timedelta) -> timedelta:
+    """Integers are read as hours, like `cache_delta`."""
+    if delta is None:
+        return default
+    elif isinstance(delta, int):
+        return timedelta(hours=delta)
+    return delta
+
+
+def cache_params(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Request parameters that change the response, everything but the auth token."""
+    return {key: value for key, value in kwargs.items() if key != "auth"}
+
+
+def params_hash(params: Dict[str, Any]) -> str:
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def query_cache_key(database_id: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Cache key of a query result, or of the index of all query results of a database when params is None."""
+    if params is None:
+        return f"query:{database_id}"
+    return f"query:{database_id}:{params_hash(params)}"
+
+
+def checkpoint_key(endpoint: str, notion_id: str, params: Dict[str, Any]) -> str:
+    return f"checkpoint:{endpoint}:{notion_id}:{params_hash(params)}"
+
+
+# Fields a cached entry keeps when the object itself is overwritten by the response of a write
+_CARRIED_ON_WRITE = {
+    "children", "children_completed", "children_reached_end",
+    "entries", "entries_completed", "entries_reached_end", "entries_cached_time",
+    "fingerprint",
+}
+
+
 class CachedEndpoint(Endpoint):
+    name: str = ""
+
     def __init__(self, parent: "CachedClient") -> None:
         super().__init__(parent)
 
+    def _with_retry(self, func_name: str, func, deadline_at: Optional[float] = None):
+        if deadline_at is not None:
+            return partial(self.parent.retry_policy.call_until, deadline_at, f"{self.name}.{func_name}", func)
+        return partial(self.parent.retry_policy.call, f"{self.name}.{func_name}", func)
+
+    def _single_flight(self, func_name: str, notion_id: str, params: Dict[str, Any], func: Callable[[], Any]) -> Any:
+        # Concurrent callers asking for the same thing share one request and one cache write
+        key = (f"{self.name}.{func_name}", notion_id, params_hash(params))
+        return self.parent.single_flight.do(key, func)
+
+    def _collect_resumable(self, func_name: str, func: Callable[..., Any], notion_id: str,
+                           params: Dict[str, Any], **kwargs: Any) -> List[Any]:
+        """collect_paginated_api that checkpoints every page and its next_cursor in the cache.
+
+        A failed or interrupted call resumes from the last checkpointed cursor on the next try. Each page is
+        stored under its own key so that checkpointing stays linear in the number of results.
+        """
+        cache = self.parent.cache
+        key = checkpoint_key(f"{self.name}.{func_name}", notion_id, params)
+        # One deadline for the whole listing, not one per page
+        call = self._with_retry(func_name, func, self.parent.retry_policy.deadline_at(f"{self.name}.{func_name}"))
+
+        results: List[Any] = []
+        pages = 0
+        start_cursor = cursor = kwargs.pop("start_cursor", None)
+        resumed_cursor = None
+        checkpoint = cache.get(key)
+        if checkpoint and cache.age_of(checkpoint) < to_timedelta(self.parent.cache_delta, timedelta(hours=1)):
+            for page in range(checkpoint["pages"]):
+                results += cache.get(f"{key}:{page}", [])
+            pages = checkpoint["pages"]
+            resumed_cursor = cursor = checkpoint["next_cursor"]
+            self.parent.logger.info(f"Resuming {self.name}.{func_name} of {notion_id} after {len(results)} results")
+
+        while True:
+            try:
+                response = call(**kwargs, start_cursor=cursor)
+            except APIResponseError as e:
+                if resumed_cursor is not None and cursor == resumed_cursor and \
+                        e.code == APIErrorCode.ValidationError:
+                    # The checkpointed cursor is no longer accepted, start over once
+                    self.parent.logger.warning(f"Discarding checkpoint of {notion_id}: {e!r}")
+                    self._clear_checkpoint(key, pages)
+                    results, pages, cursor, resumed_cursor = [], 0, start_cursor, None
+                    continue
+                raise
+            results += response.get("results")
+
+            cursor = response.get("next_cursor")
+            if not response.get("has_more") or not cursor:
+                break
+            cache.set(f"{key}:{pages}", response.get("results"))
+            pages += 1
+            cache.set(key, {"pages": pages, "next_cursor": cursor, "cached_time": datetime.now().isoformat()})
+
+        self._clear_checkpoint(key, pages)
+        return results
+
+    def _clear_checkpoint(self, key: str, pages: int) -> None:
+        if not pages:
+            return
+        self.parent.cache.delete(key)
+        for page in range(pages):
+            self.parent.cache.delete(f"{key}:{page}")
+
+    def _store_listed(self, obj: Dict[Any, Any]) -> None:
+        """Cache a block or entry as it came in a listing."""
+        cache = self.parent.cache
+        # child_page and child_database blocks share their id with a page or database they can't stand in for
+        if not self.parent.trust_listings or obj.get("type") in ("child_page", "child_database"):
+            if cache.is_outdated(obj["id"], obj):
+                cache.set(obj["id"], obj)
+            return
+
+        # Listings carry the full object, so it is as fresh as a retrieve and doesn't need one
+        cached = cache.get(obj["id"])
+        if cached is None or cached.get("last_edited_time") != obj.get("last_edited_time"):
+            cached = {**obj, "children_reached_end": False}
+        cached["cached_time"] = datetime.now().isoformat()
+        cache.set(obj["id"], cached)
+
+    def _store_written(self, obj: Dict[Any, Any]) -> None:
+        """Cache an object returned by a write, keeping the children and entries already cached for it."""
+        previous = self.parent.cache.get(obj["id"]) or {}
+        carried = {key: value for key, value in previous.items() if key in _CARRIED_ON_WRITE}
+        self.parent.cache.set(obj["id"], {**carried, **obj, "cached_time": datetime.now().isoformat()})
+
+    def _patch_listing(self, parent_id: str, list_key: str, obj: Dict[Any, Any], removed: bool = False,
+                       after: Optional[str] = None) -> None:
+        """Replace, insert or remove `obj` in the cached `children` or `entries` list of its parent."""
+        parent = self.parent.cache.get(parent_id)
+        if not parent or not parent.get(f"{list_key}_completed", False):
+            return
+
+        items = [item for item in parent.get(list_key, []) if item["id"] != obj["id"]]
+        if not removed:
+            position = next((i for i, item in enumerate(parent.get(list_key, [])) if item["id"] == obj["id"]), None)
+            if position is None and after is not None:
+                position = next((i + 1 for i, item in enumerate(items) if item["id"] == after), None)
+            items.insert(len(items) if position is None else position, obj)
+        parent[list_key] = items
+        if list_key == "children":
+            parent["has_children"] = bool(items)
+        self.parent.cache.set(parent_id, parent)
+
+    def _invalidate_listing(self, parent_id: str, list_key: str) -> None:
+        parent = self.parent.cache.get(parent_id)
+        if parent and parent.get(f"{list_key}_completed", False):
+            parent[f"{list_key}_completed"] = False
+            self.parent.cache.set(parent_id, parent)
+
+    def _serve_while_revalidating(self, id: str, refresh: Callable[[], Any]) -> Optional[Dict[Any, Any]]:
+        obj = self.parent.cache.get(id)
+        if obj is None:
+            return None
+
+        fresh_for = to_timedelta(self.parent.cache_delta, timedelta(hours=1))
+        age = self.parent.cache.age_of(obj)
+        if age >= fresh_for + to_timedelta(self.parent.stale_grace, timedelta(hours=24)):
+            return None
+        if age >= fresh_for:
+            self.parent.logger.info(f"Serving stale {id}, refreshing in background")
+            self.parent.revalidator.submit((self.name, id), refresh)
+        self.parent.stats.record("hits")
+        return obj
+
 
 def cached_endpoint(retrieve_func):
+    def fetch(self, id: str, **kwargs: Any) -> SyncAsync[Any]:
+        return self._single_flight(retrieve_func.__name__, id, cache_params(kwargs),
+                                   partial(fetch_and_store, self, id, **kwargs))
+
+    def fetch_and_store(self, id: str, **kwargs: Any) -> SyncAsync[Any]:
+        resp = self._with_retry(retrieve_func.__name__, retrieve_func)(self, id, **kwargs)
+
+        # Update cache if response is outdated
+        if self.parent.cache.is_outdated(id, resp):
+            resp["cached_time"] = datetime.now().isoformat()
+            resp["children_reached_end"] = False
+            self.parent.cache.set(id, resp)
+        else:
+            # Unchanged, only mark the cached copy as verified so it counts as fresh again
+            cached = self.parent.cache.get(id)
+            cached["cached_time"] = datetime.now().isoformat()
+            self.parent.cache.set(id, cached)
+
+        return resp
+
     @wraps(retrieve_func)
-    @retry(wait=wait_exponential(multiplier=1, min=1, max=128), stop=stop_after_attempt(7))
     def wrapper(self, id: str, cached: Optional[Dict[Any, Any]] = None, **kwargs: Any) -> SyncAsync[Any]:
 
         self.parent.logger.debug(f"ID: {id}, Cached: {cached}, Kwargs: {kwargs}")
@@ -29,23 +219,23 @@ def cached_endpoint(retrieve_func):
         if (self.parent.cache.is_recently_cached(id, self.parent.cache_delta) \
             or not self.parent.cache.is_outdated(id, cached)) and cached is not None:
             self.parent.logger.info(f"Cache hit! Retrieving {id}")
+            self.parent.stats.record("hits")
             return self.parent.cache.get(id)
 
-        resp = retrieve_func(self, id, **kwargs)
+        if self.parent.stale_while_revalidate:
+            obj = self._serve_while_revalidating(id, partial(fetch, self, id, **kwargs))
+            if obj is not None:
+                return obj
 
-        # Update cache if response is outdated
-        if self.parent.cache.is_outdated(id, resp):
-            resp["cached_time"] = datetime.now().isoformat()
-            resp["children_reached_end"] = False
-            self.parent.cache.set(id, resp)
-
-        return resp
+        self.parent.stats.record("misses")
+        return fetch(self, id, **kwargs)
 
     return wrapper
 
 
 class CachedBlocksEndpoint(BlocksEndpoint, CachedEndpoint):
     parent: "CachedClient"
+    name = "blocks"
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
@@ -55,93 +245,255 @@ class CachedBlocksEndpoint(BlocksEndpoint, CachedEndpoint):
     def retrieve(self, block_id: str, **kwargs: Any) -> SyncAsync[Any]:
         return super().retrieve(block_id, **kwargs)
 
+    def update(self, block_id: str, **kwargs: Any) -> SyncAsync[Any]:
+        resp = self._with_retry("update", super().update)(block_id, **kwargs)
+        self._write_block(resp)
+        return resp
+
+    def delete(self, block_id: str, **kwargs: Any) -> SyncAsync[Any]:
+        resp = self._with_retry("delete", super().delete)(block_id, **kwargs)
+        self._write_block(resp)
+        return resp
+
+    def _write_block(self, block: Dict[Any, Any]) -> None:
+        self._store_written(block)
+        parent_id = get_parent_id(block)
+        if parent_id:
+            self._patch_listing(parent_id, "children", block, removed=is_removed(block))
+
 
 class CachedPagesEndpoint(PagesEndpoint, CachedEndpoint):
     parent: "CachedClient"
+    name = "pages"
 
     @cached_endpoint
     def retrieve(self, page_id: str, **kwargs: Any) -> SyncAsync[Any]:
         return super().retrieve(page_id, **kwargs)
 
+    def create(self, **kwargs: Any) -> SyncAsync[Any]:
+        # Not retried, a create that timed out may still have gone through
+        resp = super().create(**kwargs)
+        self._write_page(resp)
+        return resp
+
+    def update(self, page_id: str, **kwargs: Any) -> SyncAsync[Any]:
+        resp = self._with_retry("update", super().update)(page_id, **kwargs)
+        self._write_page(resp)
+        return resp
+
+    def _write_page(self, page: Dict[Any, Any]) -> None:
+        self._store_written(page)
+        parent = page.get("parent", {})
+        if parent.get("type") == "database_id":
+            self._patch_listing(parent["database_id"], "entries", page, removed=is_removed(page))
+            # Any filtered view of the database may now match differently
+            self.parent.databases.invalidate_queries(parent["database_id"])
+        elif parent.get("type") in ("page_id", "block_id"):
+            # The parent lists the page as a child_page block, which the response doesn't give us
+            self._invalidate_listing(parent[parent["type"]], "children")
+
 
 class CachedDatabasesEndpoint(DatabasesEndpoint, CachedEndpoint):
     parent: "CachedClient"
+    name = "databases"
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # Guards the read-modify-write of the query:<database_id> index
+        self._query_index_lock = threading.Lock()
 
     @cached_endpoint
     def retrieve(self, database_id: str, **kwargs: Any) -> SyncAsync[Any]:
         return super().retrieve(database_id, **kwargs)
 
-    def query_all(self, database_id: str, **kwargs: Any) -> SyncAsync[Any]:
+    def query_all(self, database_id: str, refresh: bool = False, local: bool = False, **kwargs: Any) -> \
+            SyncAsync[Any]:
+        if local and not refresh:
+            database_cache = self.parent.cache.get(database_id, None)
+            if not database_cache or not database_cache.get("entries_completed", False):
+                self.parent.logger.info(f"Querying {database_id} through the API, its entries aren't cached")
+            elif set(kwargs) - {"filter", "sorts"}:
+                self.parent.logger.info(f"Querying {database_id} through the API, {sorted(kwargs)} need the API")
+            else:
+                try:
+                    entries = self.parent.local_query.query(database_id, partial(self._local_entries, database_id),
+                                                            self._query_cache_delta(), filter=kwargs.get("filter"),
+                                                            sorts=kwargs.get("sorts"))
+                    self.parent.logger.info(f"Answered query of {database_id} from cached entries")
+                    return entries
+                except UnsupportedFilterError as e:
+                    self.parent.logger.warning(f"Querying {database_id} through the API, {e}")
+
+        params = cache_params(kwargs)
         # Retrieve the database from the cache if it exists
         database_cache = self.parent.cache.get(database_id, None)
 
-        # Use cache only when 'entries_completed' is True
-        if database_cache and database_cache.get("entries_completed", False):
+        # Use cache only when 'entries_completed' is True and the entries are younger than the query TTL
+        if not refresh and not params and self._entries_fresh(database_cache):
             entries = database_cache.get("entries", [])
             self.parent.logger.info(f"Cache hit! Querying {database_id}")
+            self.parent.stats.record("hits")
             return entries
 
+        if not refresh:
+            entries = self._get_cached_query(database_id, params, database_cache)
+            if entries is not None:
+                self.parent.logger.info(f"Cache hit! Querying {database_id} with {params}")
+                self.parent.stats.record("hits")
+                return entries
+
+        self.parent.stats.record("misses")
+        return self._single_flight("query", database_id, params,
+                                   partial(self._query_and_store, database_id, params, database_cache, **kwargs))
+
+    def _query_and_store(self, database_id: str, params: Dict[str, Any], database_cache: Optional[Dict[Any, Any]],
+                         **kwargs: Any) -> List[Any]:
         try:
-            resp = collect_paginated_api(self.query, database_id=database_id, **kwargs)
+            resp = self._collect_resumable("query", self.query, database_id, params, database_id=database_id,
+                                           **kwargs)
         except Exception as e:
-            self.parent.logger.error(e)
-            self.parent.logger.error(database_id, kwargs)
-            return []
+            self.parent.logger.error(f"Failed to query {database_id} with {kwargs}: {e!r}")
+            raise
         self.parent.logger.debug(resp)
 
-        # If the database is not cached, don't cache the entries
-        # TODO: Add a flag to caching parent first so that we can cache the entries
-        if database_cache:
-            entries = resp
-
-            database_cache["entries"] = entries
+        # Only an unfiltered query lists all entries of the database
+        if database_cache and not params:
+            database_cache["entries"] = resp
             database_cache["entries_completed"] = True
+            database_cache["entries_reached_end"] = True
+            database_cache["entries_cached_time"] = datetime.now().isoformat()
 
             self.parent.cache.set(database_id, database_cache)
 
+        # With filter_properties the entries lack properties, they can't stand in for the pages
+        if "filter_properties" not in params:
             for entry in resp:
-                # if entry is outdated, update cache
-                if self.parent.cache.is_outdated(entry["id"], entry):
-                    self.parent.cache.set(entry["id"], entry)
+                self._store_listed(entry)
 
+        # The unfiltered result already went onto the database entry, don't store it twice
+        if params or not database_cache:
+            self._set_cached_query(database_id, params, resp, database_cache)
         return resp
 
+    def _get_cached_query(self, database_id: str, params: Dict[str, Any],
+                          database_cache: Optional[Dict[Any, Any]]) -> Optional[List[Any]]:
+        cached_query = self.parent.cache.get(query_cache_key(database_id, params))
+        if cached_query is None:
+            return None
+
+        # A schema change of the database invalidates all of its query results
+        if database_cache and database_cache.get("last_edited_time") != cached_query["database_last_edited_time"]:
+            return None
+        if self.parent.cache.age_of(cached_query) >= self._query_cache_delta():
+            return None
+        return cached_query["entries"]
+
+    def _query_cache_delta(self) -> timedelta:
+        return to_timedelta(self.parent.query_cache_delta, to_timedelta(self.parent.cache_delta, timedelta(hours=1)))
+
+    def _entries_fresh(self, database_cache: Optional[Dict[Any, Any]]) -> bool:
+        if not database_cache or not database_cache.get("entries_completed", False):
+            return False
+        cached_time = database_cache.get("entries_cached_time")
+        return cached_time is not None and \
+            datetime.now() - datetime.fromisoformat(cached_time) < self._query_cache_delta()
+
+    def _local_entries(self, database_id: str) -> Tuple[List[Any], datetime]:
+        # The cached entries while they are younger than the query TTL, a fresh listing otherwise
+        database_cache = self.parent.cache.get(database_id, None)
+        if self._entries_fresh(database_cache):
+            return database_cache["entries"], datetime.fromisoformat(database_cache["entries_cached_time"])
+        return self.query_all(database_id, refresh=True), datetime.now()
+
+    def _set_cached_query(self, database_id: str, params: Dict[str, Any], entries: List[Any],
+                          database_cache: Optional[Dict[Any, Any]]) -> None:
+        key = query_cache_key(database_id, params)
+        self.parent.cache.set(key, {
+            "object": "query_result",
+            "database_id": database_id,
+            "params": params,
+            "entries": entries,
+            "database_last_edited_time": database_cache.get("last_edited_time") if database_cache else None,
+            "cached_time": datetime.now().isoformat(),
+        })
+
+        index_key = query_cache_key(database_id)
+        with self._query_index_lock:
+            index = self.parent.cache.get(index_key, [])
+            if key not in index:
+                self.parent.cache.set(index_key, index + [key])
+
+    def create_local_index(self, database_id: str, property_name: str) -> None:
+        """Index a property of the cached entries to speed up `query_all(..., local=True)`."""
+        self.parent.local_query.create_index(database_id, property_name, partial(self._local_entries, database_id),
+                                             self._query_cache_delta())
+
+    def invalidate_queries(self, database_id: str) -> None:
+        """Drop every cached query result of a database."""
+        index_key = query_cache_key(database_id)
+        with self._query_index_lock:
+            for key in self.parent.cache.get(index_key, []):
+                self.parent.cache.delete(key)
+            self.parent.cache.delete(index_key)
+
 
 class CachedBlocksChildrenEndpoint(BlocksChildrenEndpoint, CachedEndpoint):
     parent: "CachedClient"
+    name = "blocks.children"
+
+    def append(self, block_id: str, **kwargs: Any) -> SyncAsync[Any]:
+        # Not retried, an append that timed out may still have gone through
+        resp = super().append(block_id, **kwargs)
+        after = kwargs.get("after")
+        for block in resp.get("results", []):
+            self._store_written(block)
+            self._patch_listing(block_id, "children", block, after=after)
+            after = block["id"]
+
+        parent = self.parent.cache.get(block_id)
+        if resp.get("results") and parent and not parent.get("has_children", True):
+            parent["has_children"] = True
+            self.parent.cache.set(block_id, parent)
+        return resp
 
-    def list_all(self, block_id: str, **kwargs: Any) -> \
+    def list_all(self, block_id: str, refresh: bool = False, **kwargs: Any) -> \
             SyncAsync[Any]:
         # Retrieve the block from the cache if it exists
         block_cache = self.parent.cache.get(block_id, None)
 
         # Use cache only when 'children_completed' is True
-        if block_cache and block_cache.get("children_completed", False):
+        if not refresh and block_cache and block_cache.get("children_completed", False):
             children = block_cache.get("children", [])
             self.parent.logger.info(f"Cache hit! Listing {block_id}")
+            self.parent.stats.record("hits")
             return children
 
+        self.parent.stats.record("misses")
+        return self._single_flight("list", block_id, cache_params(kwargs),
+                                   partial(self._list_and_store, block_id, block_cache, **kwargs))
+
+    def _list_and_store(self, block_id: str, block_cache: Optional[Dict[Any, Any]], **kwargs: Any) -> List[Any]:
         try:
-            resp = collect_paginated_api(self.list, block_id=block_id, **kwargs)
+            resp = self._collect_resumable("list", self.list, block_id, cache_params(kwargs), block_id=block_id,
+                                           **kwargs)
         except Exception as e:
-            self.parent.logger.error(e)
-            self.parent.logger.error(block_id, kwargs)
-            return []
+            self.parent.logger.error(f"Failed to list children of {block_id} with {kwargs}: {e!r}")
+            raise
         self.parent.logger.debug(resp)
 
-        # If the parent block is not cached, don't cache the children
-        # TODO: Add a flag to caching parent first so that we can cache the children
+        # The children list is kept on the parent, so it is only cached when the parent is
         if block_cache:
             children = resp
 
             block_cache["children"] = children
             block_cache["children_completed"] = True
+            block_cache["children_reached_end"] = True
 
             self.parent.cache.set(block_id, block_cache)
 
+        # With trust_listings the children themselves are cached even when the parent isn't
+        if block_cache or self.parent.trust_listings:
             for block in resp:
-                # if block is outdated, update cache
-                if self.parent.cache.is_outdated(block["id"], block):
-                    self.parent.cache.set(block["id"], block)
+                self._store_listed(block)
 
         return resp
@@ -1,13 +1,26 @@
+import threading
 from abc import abstractmethod
+from copy import deepcopy
 from datetime import timedelta, datetime
-from typing import Optional, Dict, Union, Any
+from typing import Optional, Dict, Union, Any, Callable, Iterable, Iterator, Tuple, TYPE_CHECKING
 
 import httpx
 from notion_client import Client
-from notion_client.client import ClientOptions
-from sqlitedict import SqliteDict
+from notion_client.client import BaseClient, ClientOptions
 
-from cached_notion.cached_api_endpoints import CachedBlocksEndpoint, CachedPagesEndpoint, CachedDatabasesEndpoint
+from cached_notion.cached_api_endpoints import CachedBlocksEndpoint, CachedPagesEndpoint, CachedDatabasesEndpoint, \
+    to_timedelta
+from cached_notion.local_query import LocalQueryEngine
+from cached_notion.retry_policy import RetryPolicy
+from cached_notion.revalidator import Revalidator
+from cached_notion.singleflight import SingleFlight
+from cached_notion.stats import CacheStats
+from cached_notion.token_pool import TokenPool, object_key
+from cached_notion.transport import HTTPOptions, build_http_client, request_timeout
+
+if TYPE_CHECKING:
+    from cached_notion.journal import ChangeJournal
+    from cached_notion.search_index import SearchIndex
 
 
 class NotionCache:
@@ -19,20 +32,38 @@ class NotionCache:
     def set(self, notion_id: str, value):
         pass
 
+    @abstractmethod
+    def delete(self, notion_id: str):
+        pass
+
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        pass
+
+    def add_listener(self, listener: Callable[[str, Optional[Dict], Optional[Dict]], None]):
+        """Call `listener(notion_id, previous, value)` after every set and delete."""
+        if "listeners" not in self.__dict__:
+            self.listeners = []
+        self.listeners.append(listener)
+
+    def _notify(self, notion_id: str, previous: Optional[Dict], value: Optional[Dict]):
+        for listener in self.__dict__.get("listeners", []):
+            listener(notion_id, previous, value)
+
+    @staticmethod
+    def age_of(obj: Dict) -> timedelta:
+        cached_time = datetime.fromisoformat(
+            obj.get("cached_time", "2000-01-01T00:00:00.000000"))
+        return datetime.now() - cached_time
+
     def is_recently_cached(self, notion_id: str, delta: Optional[Union[timedelta, int]] = None):
-        if delta is None:
-            delta = timedelta(hours=1)
-        elif isinstance(delta, int):
-            delta = timedelta(hours=delta)
+        delta = to_timedelta(delta, timedelta(hours=1))
 
         obj = self.get(notion_id)
         if obj is None:
             return False
 
-        cached_time = datetime.fromisoformat(
-            obj.get("cached_time", "2000-01-01T00:00:00.000000"))
-
-        return datetime.now() - cached_time < delta
+        return self.age_of(obj) < delta
 
     def is_outdated(self, notion_id: str, notion_obj: Optional[Dict]):
         if notion_obj is None:
@@ -45,6 +76,24 @@ class NotionCache:
         last_updated = obj.get("last_edited_time", 0)
         return last_updated != notion_obj.get("last_edited_time", "")
 
+    def set_fingerprint(self, notion_id: str, fingerprint: str):
+        obj = self.get(notion_id)
+        if obj is None or obj.get("fingerprint") == fingerprint:
+            return
+        obj["fingerprint"] = fingerprint
+        self.set(notion_id, obj)
+
+    def export_snapshot(self, path: str, roots: Optional[Iterable[str]] = None,
+                        max_age: Optional[Union[timedelta, int]] = None) -> int:
+        """Write a compressed, checksummed snapshot of the cache, see `cached_notion.snapshot`."""
+        from cached_notion.snapshot import export_snapshot
+        return export_snapshot(self, path, roots=roots, max_age=max_age)
+
+    def import_snapshot(self, path: str) -> int:
+        """Merge a snapshot into the cache, keeping the newer `last_edited_time` of every object."""
+        from cached_notion.snapshot import import_snapshot
+        return import_snapshot(self, path)
+
     def get_object_type(self, notion_id: str):
         obj = self.get(notion_id)
         if obj is None:
@@ -55,13 +104,59 @@ class NotionCache:
 class SqliteDictCache(NotionCache):
     def __init__(self, path):
         self.path = path
-        self.db = SqliteDict(path, autocommit=True)
+        self._db = None
+        self._open_lock = threading.Lock()
+
+    @property
+    def db(self):
+        # Opened on first use, so constructing a client costs nothing until the cache is actually read
+        if self._db is None:
+            with self._open_lock:
+                if self._db is None:
+                    from sqlitedict import SqliteDict
+                    self._db = SqliteDict(self.path, autocommit=True)
+        return self._db
 
     def get(self, notion_id, default=None):
         return self.db.get(notion_id, default)
 
     def set(self, notion_id, value):
+        previous = self.db.get(notion_id) if self.__dict__.get("listeners") else None
         self.db[notion_id] = value
+        self._notify(notion_id, previous, value)
+
+    def delete(self, notion_id):
+        previous = self.db.pop(notion_id, None)
+        self._notify(notion_id, previous, None)
+
+    def items(self):
+        return self.db.items()
+
+
+class MemoryCache(NotionCache):
+    """Process-local cache, gone when the process exits.
+
+    Values are copied in and out like a pickling store would, so changing a returned object never changes the cache.
+    """
+
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+
+    def get(self, notion_id, default=None):
+        value = self.data.get(notion_id)
+        return default if value is None else deepcopy(value)
+
+    def set(self, notion_id, value):
+        previous = self.data.get(notion_id)
+        self.data[notion_id] = deepcopy(value)
+        self._notify(notion_id, previous, value)
+
+    def delete(self, notion_id):
+        previous = self.data.pop(notion_id, None)
+        self._notify(notion_id, previous, None)
+
+    def items(self):
+        return [(notion_id, deepcopy(value)) for notion_id, value in self.data.items()]
 
 
 class CachedClient(Client):
@@ -71,15 +166,103 @@ class CachedClient(Client):
             client: Optional[httpx.Client] = None,
             cache: Optional[NotionCache] = None,
             cache_delta: Optional[Union[timedelta, int]] = None,
+            query_cache_delta: Optional[Union[timedelta, int]] = None,
+            retry_policy: Optional[RetryPolicy] = None,
+            stale_while_revalidate: bool = False,
+            stale_grace: Optional[Union[timedelta, int]] = None,
+            revalidate_workers: int = 2,
+            http_options: Optional[HTTPOptions] = None,
+            search_index: Optional["SearchIndex"] = None,
+            token_pool: Optional[TokenPool] = None,
+            change_journal: Optional["ChangeJournal"] = None,
+            trust_listings: bool = False,
             **kwargs: Any,
     ):
-        super().__init__(options, client, **kwargs)
+        self.http_options = http_options if http_options is not None else HTTPOptions()
+        self._client_lock = threading.Lock()
+        # Client.__init__ would build a default httpx.Client right away, the `client` property builds ours lazily
+        BaseClient.__init__(self, client, options, **kwargs)
         if cache is None:
             self.cache = SqliteDictCache("notion_cache.sqlite")
         else:
             self.cache = cache
 
         self.cache_delta = cache_delta
+        # How long a filtered/sorted query result is served from the cache, defaults to cache_delta
+        self.query_cache_delta = query_cache_delta
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        # Serve entries up to cache_delta + stale_grace old straight from the cache, refreshing them in the background
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_grace = stale_grace
+        self.revalidator = Revalidator(revalidate_workers, logger=self.logger)
+        self.stats = CacheStats()
+        self.single_flight = SingleFlight()
+        self.search_index = search_index
+        # Requests without an explicit `auth` are spread over the pool's tokens instead of using options.auth
+        self.token_pool = token_pool
+        self._local_query: Optional[LocalQueryEngine] = None
+        if search_index is not None:
+            search_index.attach(self.cache)
+        self.change_journal = change_journal
+        # Cache listed children and entries as fresh objects and serve them without a per-object retrieve
+        self.trust_listings = trust_listings
+        if change_journal is not None:
+            change_journal.attach(self.cache)
         self.blocks = CachedBlocksEndpoint(self)
         self.pages = CachedPagesEndpoint(self)
-        self.databases = CachedDatabasesEndpoint(self)
\ No newline at end of file
+        self.databases = CachedDatabasesEndpoint(self)
+
+    @property
+    def local_query(self) -> LocalQueryEngine:
+        # Created on first use, it listens to every cache write from then on
+        if self._local_query is None:
+            self._local_query = LocalQueryEngine(self.cache)
+        return self._local_query
+
+    def search_local(self, query: str, limit: int = 20):
+        """Search the cached content without calling Notion. Needs a `search_index`."""
+        if self.search_index is None:
+            raise ValueError("search_local needs CachedClient(search_index=SearchIndex(path))")
+        return self.search_index.search(query, limit)
+
+    @property
+    def client(self) -> httpx.Client:
+        # Creating the transport imports httpcore, most of the startup time, so wait for the first request
+        if not self._clients:
+            with self._client_lock:
+                if not self._clients:
+                    self.client = build_http_client(self.http_options)
+        return self._clients[-1]
+
+    @client.setter
+    def client(self, client: Optional[httpx.Client]) -> None:
+        if client is not None:
+            BaseClient.client.fset(self, client)
+
+    def __enter__(self) -> "CachedClient":
+        self.client = build_http_client(self.http_options)
+        self.client.__enter__()
+        return self
+
+    def _build_request(self, method: str, path: str, *args: Any, **kwargs: Any) -> httpx.Request:
+        request = super()._build_request(method, path, *args, **kwargs)
+        timeout = request_timeout(self.http_options, self.options.timeout_ms / 1_000, method, path)
+        request.extensions["timeout"] = timeout.as_dict()
+        return request
+
+    def request(self, path: str, method: str, query: Optional[Dict[Any, Any]] = None,
+                body: Optional[Dict[Any, Any]] = None, auth: Optional[str] = None) -> Any:
+        if self.token_pool is None or auth is not None:
+            self.stats.record("api_calls")
+            return super().request(path, method, query, body, auth)
+
+        def send(token: str) -> Any:
+            self.stats.record("api_calls")
+            return super(CachedClient, self).request(path, method, query, body, token)
+
+        return self.token_pool.call(send, key=object_key(path))
+
+    def close(self) -> None:
+        self.revalidator.shutdown()
+        if self._clients:
+            super().close()
@@ -0,0 +1,116 @@
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional
+
+from cached_notion.cached_client import CachedClient, SqliteDictCache
+from cached_notion.token_pool import TokenPool
+from cached_notion.utils import get_id_with_object_type, normalize_url, url_to_md, warm_cache
+
+
+def _read_roots(args: argparse.Namespace) -> List[str]:
+    roots = list(args.roots)
+    if args.file:
+        with open(args.file) as f:
+            roots += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return roots
+
+
+def _build_client(args: argparse.Namespace) -> CachedClient:
+    tokens = args.token or [token for token in [os.environ.get("NOTION_TOKEN")] if token]
+    if not tokens:
+        raise SystemExit("A Notion token is required, pass --token or set NOTION_TOKEN")
+    from cached_notion.pretty_logger import setup_logger
+
+    logger = setup_logger("cached_notion", level=logging.ERROR if not args.verbose else logging.INFO)
+    return CachedClient(
+        auth=tokens[0] if len(tokens) == 1 else None,
+        token_pool=TokenPool(tokens) if len(tokens) > 1 else None,
+        logger=logger,
+        log_level=logger.level,
+        cache=SqliteDictCache(args.cache),
+        cache_delta=args.cache_delta,
+        trust_listings=args.trust_listings,
+    )
+
+
+def _warm(client: CachedClient, root: str, args: argparse.Namespace) -> str:
+    pages = warm_cache(client, root, args.max_depth)
+    return f"{pages} pages"
+
+
+def _export(client: CachedClient, root: str, args: argparse.Namespace) -> str:
+    notion_id, _ = get_id_with_object_type(normalize_url(root))
+    md, _ = url_to_md(client, root, args.max_depth)
+    path = Path(args.output) / f"{notion_id}.md"
+    path.write_text(md, encoding="utf-8")
+    return str(path)
+
+
+def _run(args: argparse.Namespace, command) -> int:
+    roots = _read_roots(args)
+    if not roots:
+        raise SystemExit("No roots given")
+    client = _build_client(args)
+
+    failed = 0
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(command, client, root, args): root for root in roots}
+        for future in as_completed(futures):
+            root = futures[future]
+            try:
+                print(f"ok    {root} -> {future.result()}")
+            except Exception as e:
+                failed += 1
+                print(f"error {root}: {e!r}", file=sys.stderr)
+    elapsed = max(time.monotonic() - started, 1e-6)
+    client.close()
+
+    stats = client.stats
+    print(
+        f"{len(roots) - failed}/{len(roots)} roots in {elapsed:.1f}s "
+        f"({len(roots) / elapsed:.2f} roots/s, {stats['api_calls'] / elapsed:.2f} API calls/s), "
+        f"API calls: {stats['api_calls']}, cache hits: {stats['hits']}, misses: {stats['misses']}, "
+        f"hit rate: {stats.hit_rate:.1%}"
+    )
+    return 1 if failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cached-notion", description="Warm and export a Notion cache.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("roots", nargs="*", help="Notion URLs to crawl")
+    common.add_argument("-f", "--file", help="file with one Notion URL per line")
+    common.add_argument("--token", action="append",
+                        help="Notion integration token, defaults to $NOTION_TOKEN. Repeat it to spread the crawl "
+                             "over several integrations")
+    common.add_argument("--cache", default="notion_cache.sqlite", help="path of the sqlite cache")
+    common.add_argument("--cache-delta", type=int, default=24, help="hours a cached object is considered fresh")
+    common.add_argument("--max-depth", type=int, default=-1, help="depth of sub pages to follow, -1 for no limit")
+    common.add_argument("--trust-listings", action="store_true",
+                        help="cache listed blocks and entries as fresh instead of retrieving each of them")
+    common.add_argument("-w", "--workers", type=int, default=4, help="number of roots crawled in parallel")
+    common.add_argument("-v", "--verbose", action="store_true")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("warm", parents=[common], help="crawl roots into the cache")
+    export = subparsers.add_parser("export", parents=[common], help="write Markdown for each root into a directory")
+    export.add_argument("-o", "--output", default=".", help="directory to write <id>.md files into")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "warm":
+        return _run(args, _warm)
+    Path(args.output).mkdir(parents=True, exist_ok=True)
+    return _run(args, _export)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import csv
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+from cached_notion.local_query import typed_value
+
+if TYPE_CHECKING:
+    from cached_notion.cached_client import CachedClient
+
+_STRING_TYPES = {"title", "rich_text", "url", "email", "phone_number", "select", "status", "created_by",
+                 "last_edited_by"}
+_LIST_TYPES = {"multi_select", "people", "relation"}
+_TIME_TYPES = {"date", "created_time", "last_edited_time"}
+
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+
+
+def _column_type(property_type: str) -> str:
+    if property_type in _STRING_TYPES:
+        return "string"
+    if property_type in _LIST_TYPES:
+        return "list"
+    if property_type in _TIME_TYPES:
+        return "timestamp"
+    if property_type in ("number", "checkbox", "unique_id"):
+        return property_type
+    # Formulas, rollups, files and anything newer are exported as text
+    return "other"
+
+
+def database_schema(database: Optional[Dict], entries: List[Dict]) -> Dict[str, str]:
+    """Property name to column type, from the database object or else from the properties of the entries."""
+    schema = {name: _column_type(prop.get("type", "")) for name, prop in (database or {}).get("properties", {}).items()}
+    for entry in entries:
+        for name, prop in entry.get("properties", {}).items():
+            schema.setdefault(name, _column_type(prop.get("type", "")))
+    return schema
+
+
+def _other_value(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def entries_to_columns(entries: List[Dict], schema: Dict[str, str]) -> Dict[str, List[Any]]:
+    """Decode entries property by property into one list of typed values per column, `id` first."""
+    columns: Dict[str, List[Any]] = {"id": [entry["id"] for entry in entries]}
+    for name, column_type in schema.items():
+        values = [typed_value(entry["properties"][name]) if name in entry.get("properties", {}) else None
+                  for entry in entries]
+        if column_type == "other":
+            values = [_other_value(value) for value in values]
+        columns[name] = values
+    return columns
+
+
+def _iter_chunks(client: "CachedClient", database_id: str, chunk_size: int, refresh: bool,
+                 **kwargs: Any) -> Iterator[Tuple[Dict[str, str], List[Dict]]]:
+    database = None if refresh else client.cache.get(database_id)
+    if database and not kwargs and database.get("entries_completed", False):
+        entries = database.get("entries", [])
+        schema = database_schema(database, entries)
+        for start in range(0, len(entries), chunk_size):
+            yield schema, entries[start:start + chunk_size]
+        return
+
+    if database is None:
+        database = client.databases.retrieve(database_id)
+    query = client.databases._with_retry("query", client.databases.query)
+    kwargs.setdefault("page_size", 100)
+    schema = None
+    buffer: List[Dict] = []
+    cursor = None
+    while True:
+        response = query(database_id=database_id, start_cursor=cursor, **kwargs)
+        buffer += response.get("results")
+        cursor = response.get("next_cursor")
+        done = not response.get("has_more") or not cursor
+        while len(buffer) >= chunk_size or (done and buffer):
+            chunk, buffer = buffer[:chunk_size], buffer[chunk_size:]
+            # Fixed by the first chunk, so that every chunk has the same columns
+            schema = schema or database_schema(database, chunk)
+            yield schema, chunk
+        if done:
+            break
+
+
+def iter_column_chunks(client: "CachedClient", database_id: str, chunk_size: int = 1000, refresh: bool = False,
+                       **kwargs: Any) -> Iterator[Dict[str, List[Any]]]:
+    """Yield the entries of a database as columns, `chunk_size` rows at a time.
+
+    Completely cached entries are read from the cache. Otherwise the entries are paginated from the API with
+    the query `kwargs` and only one chunk is held in memory at a time, so streamed entries are not cached.
+    """
+    for schema, chunk in _iter_chunks(client, database_id, chunk_size, refresh, **kwargs):
+        yield entries_to_columns(chunk, schema)
+
+
+def to_pandas(columns: Dict[str, List[Any]]):
+    try:
+        import pandas as pd
+    except ImportError:
+        raise ImportError("to_pandas needs `pip install pandas`")
+    return pd.DataFrame(columns)
+
+
+def _arrow_schema(schema: Dict[str, str]):
+    import pyarrow as pa
+
+    types = {
+        "string": pa.string(),
+        "list": pa.list_(pa.string()),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "number": pa.float64(),
+        "checkbox": pa.bool_(),
+        "unique_id": pa.int64(),
+        "other": pa.string(),
+    }
+    return pa.schema([("id", pa.string())] + [(name, types[column_type]) for name, column_type in schema.items()])
+
+
+def to_arrow(columns: Dict[str, List[Any]], schema: Optional[Dict[str, str]] = None):
+    """A pyarrow Table of the columns, typed by the column types of `database_schema` when given."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("to_arrow needs `pip install pyarrow`")
+    if schema is None:
+        return pa.table(columns)
+    return pa.table(columns, schema=_arrow_schema(schema))
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, list):
+        return ", ".join(str(item) for item in value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+
+class _CSVWriter:
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._header = False
+
+    def write(self, columns: Dict[str, List[Any]], schema: Dict[str, str]) -> None:
+        if not self._header:
+            self._writer.writerow(columns)
+            self._header = True
+        self._writer.writerows(zip(*([_csv_value(value) for value in values] for values in columns.values())))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ArrowWriter:
+    def __init__(self, path: str, format: str) -> None:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError(f"Exporting {format} needs `pip install pyarrow`")
+        self.path = path
+        self.format = format
+        self._writer = None
+
+    def write(self, columns: Dict[str, List[Any]], schema: Dict[str, str]) -> None:
+        table = to_arrow(columns, schema)
+        if self._writer is None:
+            if self.format == "parquet":
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                import pyarrow.ipc as ipc
+                self._writer = ipc.new_file(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+def export_database(client: "CachedClient", database_id: str, path: str, format: Optional[str] = None,
+                    chunk_size: int = 1000, refresh: bool = False, **kwargs: Any) -> int:
+    """Write the entries of a database to a CSV, Parquet or Arrow file chunk by chunk, returns the row count.
+
+    The format is taken from the file extension unless given. Parquet and Arrow need `pyarrow`.
+    """
+    if format is None:
+        format = next((name for suffix, name in FORMATS.items() if path.endswith(suffix)), None)
+    if format not in FORMATS.values():
+        raise ValueError(f"Unknown export format for {path}, use one of {sorted(set(FORMATS.values()))}")
+
+    writer = _CSVWriter(path) if format == "csv" else _ArrowWriter(path, format)
+    rows = 0
+    try:
+        for schema, chunk in _iter_chunks(client, database_id, chunk_size, refresh, **kwargs):
+            writer.write(entries_to_columns(chunk, schema), schema)
+            rows += len(chunk)
+    finally:
+        writer.close()
+    client.logger.info(f"Exported {rows} entries of {database_id} to {path}")
+    return rows
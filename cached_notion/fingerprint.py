@@ -0,0 +1,58 @@
+import hashlib
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+if TYPE_CHECKING:
+    from .cached_client import NotionCache
+
+
+def node_fingerprint(notion_obj: Dict, child_fingerprints: Iterable[str]) -> str:
+    """Merkle-style fingerprint of a subtree: the node's own edit time combined with its children's fingerprints."""
+    digest = hashlib.sha1()
+    digest.update(notion_obj["id"].encode())
+    digest.update(notion_obj.get("last_edited_time", "").encode())
+    for child_fingerprint in child_fingerprints:
+        digest.update(b"\0")
+        digest.update(child_fingerprint.encode())
+    return digest.hexdigest()
+
+
+def fingerprint_tree(cache: "NotionCache", root_id: str) -> Dict[str, str]:
+    """Collect the stored fingerprint of every cached subtree under `root_id`, keyed by id."""
+    fingerprints = {}
+    stack = [root_id]
+    while stack:
+        notion_id = stack.pop()
+        if notion_id in fingerprints:
+            continue
+        obj = cache.get(notion_id)
+        if obj is None or obj.get("fingerprint") is None:
+            continue
+        fingerprints[notion_id] = obj["fingerprint"]
+        stack += [child["id"] for child in obj.get("children", []) or []]
+        stack += [entry["id"] for entry in obj.get("entries", []) or []]
+    return fingerprints
+
+
+def diff_fingerprints(before: Dict[str, str], after: Dict[str, str]) -> Dict[str, List[str]]:
+    """Compare two `fingerprint_tree` results taken before and after a sync.
+
+    A change deep in the tree also changes the fingerprints of all its ancestors, so "changed" lists
+    every subtree that contains a change.
+    """
+    return {
+        "added": [notion_id for notion_id in after if notion_id not in before],
+        "removed": [notion_id for notion_id in before if notion_id not in after],
+        "changed": [notion_id for notion_id, fp in after.items() if before.get(notion_id, fp) != fp],
+    }
+
+
+def expand_cached(cache: "NotionCache", notion_id: str, fallback: Optional[Dict] = None) -> Optional[Dict]:
+    """Rebuild a subtree from cached entries alone, without calling Notion."""
+    obj = cache.get(notion_id, fallback)
+    if obj is None:
+        return None
+    if obj.get("children_completed", False):
+        obj["children"] = [expand_cached(cache, child["id"], child) for child in obj.get("children", [])]
+    if obj.get("entries_completed", False):
+        obj["entries"] = [expand_cached(cache, entry["id"], entry) for entry in obj.get("entries", [])]
+    return obj
@@ -0,0 +1,92 @@
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from cached_notion.cached_client import NotionCache
+from cached_notion.objects import get_parent_id, is_removed
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    object TEXT,
+    parent_id TEXT,
+    old_last_edited_time TEXT,
+    new_last_edited_time TEXT,
+    deleted INTEGER NOT NULL,
+    recorded_at TEXT NOT NULL
+);
+"""
+_COLUMNS = ("seq", "id", "object", "parent_id", "old_last_edited_time", "new_last_edited_time", "deleted",
+            "recorded_at")
+
+
+def _is_notion_object(value: Any) -> bool:
+    return isinstance(value, dict) and value.get("object") in ("page", "database", "block")
+
+
+class ChangeJournal:
+    """Append-only SQLite log of the objects whose `last_edited_time` changed in the cache.
+
+    Consumers remember the last `seq` they processed and read only what came after it with `changes_since`.
+    Deleting an object from the cache, or caching it archived or trashed, is journaled with `deleted` set.
+    """
+
+    def __init__(self, path: str = "notion_journal.sqlite") -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def attach(self, cache: NotionCache) -> None:
+        cache.add_listener(self._on_cache_change)
+
+    def _on_cache_change(self, notion_id: str, previous: Optional[Dict], value: Optional[Dict]) -> None:
+        previous = previous if _is_notion_object(previous) else None
+        value = value if _is_notion_object(value) else None
+        if previous is None and value is None:
+            return
+        old_time = previous.get("last_edited_time") if previous else None
+        new_time = value.get("last_edited_time") if value else None
+        deleted = value is None or is_removed(value)
+        if old_time == new_time and deleted == (previous is not None and is_removed(previous)):
+            # Re-cached without an edit, e.g. a refreshed cached_time or a fingerprint
+            return
+        self.record(notion_id, value or previous, old_time, new_time, deleted)
+
+    def record(self, notion_id: str, notion_obj: Dict, old_last_edited_time: Optional[str],
+               new_last_edited_time: Optional[str], deleted: bool = False) -> int:
+        """Append a change and return its sequence number."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO changes (id, object, parent_id, old_last_edited_time, new_last_edited_time, deleted, "
+                "recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (notion_id, notion_obj.get("object"), get_parent_id(notion_obj), old_last_edited_time,
+                 new_last_edited_time, int(deleted), datetime.now().isoformat()),
+            )
+            return cursor.lastrowid
+
+    def changes_since(self, seq: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Changes with a sequence number above `seq`, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM changes WHERE seq > ? ORDER BY seq LIMIT ?",
+                (seq, -1 if limit is None else limit),
+            ).fetchall()
+        changes = [dict(zip(_COLUMNS, row)) for row in rows]
+        for change in changes:
+            change["deleted"] = bool(change["deleted"])
+        return changes
+
+    def last_seq(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def truncate(self, seq: int) -> int:
+        """Drop the changes up to and including `seq` once every consumer is past them."""
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM changes WHERE seq <= ?", (seq,)).rowcount
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,331 @@
+import threading
+from copy import deepcopy
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from cached_notion.cached_client import NotionCache
+
+
+class UnsupportedFilterError(ValueError):
+    """The filter or sort uses a condition that can't be evaluated locally."""
+
+
+def _plain_text(rich_text: Optional[List[Dict]]) -> str:
+    return "".join(item.get("plain_text", "") for item in rich_text or [])
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def typed_value(prop: Dict) -> Any:
+    """The value of a page property as text, number, bool, datetime or a list, whatever its type."""
+    prop_type = prop.get("type")
+    value = prop.get(prop_type)
+    if prop_type in ("title", "rich_text"):
+        return _plain_text(value)
+    if prop_type in ("select", "status"):
+        return value.get("name") if value else None
+    if prop_type == "multi_select":
+        return [option.get("name") for option in value or []]
+    if prop_type == "date":
+        return _parse_date(value.get("start")) if value else None
+    if prop_type in ("created_time", "last_edited_time"):
+        return _parse_date(value)
+    if prop_type in ("people", "relation"):
+        return [item.get("id") for item in value or []]
+    if prop_type in ("created_by", "last_edited_by"):
+        return value.get("id") if value else None
+    if prop_type == "formula":
+        return typed_value(value) if value else None
+    if prop_type == "unique_id":
+        return value.get("number") if value else None
+    return value
+
+
+def property_value(entry: Dict, name: str) -> Any:
+    prop = entry.get("properties", {}).get(name)
+    if prop is None:
+        raise UnsupportedFilterError(f"Unknown property {name!r}")
+    return typed_value(prop)
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == []
+
+
+def _text_condition(value: Optional[str], condition: str, operand: Any) -> bool:
+    value = value or ""
+    if condition == "equals":
+        return value == operand
+    if condition == "does_not_equal":
+        return value != operand
+    if condition == "contains":
+        return operand.lower() in value.lower()
+    if condition == "does_not_contain":
+        return operand.lower() not in value.lower()
+    if condition == "starts_with":
+        return value.lower().startswith(operand.lower())
+    if condition == "ends_with":
+        return value.lower().endswith(operand.lower())
+    raise UnsupportedFilterError(f"Unsupported text condition {condition!r}")
+
+
+def _number_condition(value: Optional[float], condition: str, operand: Any) -> bool:
+    if condition == "equals":
+        return value == operand
+    if condition == "does_not_equal":
+        return value != operand
+    if value is None:
+        return False
+    if condition == "greater_than":
+        return value > operand
+    if condition == "less_than":
+        return value < operand
+    if condition == "greater_than_or_equal_to":
+        return value >= operand
+    if condition == "less_than_or_equal_to":
+        return value <= operand
+    raise UnsupportedFilterError(f"Unsupported number condition {condition!r}")
+
+
+def _start_of_day(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _date_condition(value: Optional[datetime], condition: str, operand: Any, now: datetime) -> bool:
+    relative = {
+        "past_week": (now - timedelta(weeks=1), now),
+        "past_month": (now - timedelta(days=30), now),
+        "past_year": (now - timedelta(days=365), now),
+        "next_week": (now, now + timedelta(weeks=1)),
+        "next_month": (now, now + timedelta(days=30)),
+        "next_year": (now, now + timedelta(days=365)),
+        "this_week": (_start_of_day(now) - timedelta(days=now.weekday()),
+                      _start_of_day(now) + timedelta(days=7 - now.weekday())),
+    }
+    if value is None:
+        return False
+    if condition in relative:
+        start, end = relative[condition]
+        return start <= value <= end
+
+    operand_date = _parse_date(operand)
+    # A date without a time covers the whole day
+    whole_day = isinstance(operand, str) and len(operand) == 10
+    day_end = operand_date + timedelta(days=1) if whole_day else operand_date
+    if condition == "equals":
+        return operand_date <= value < day_end if whole_day else value == operand_date
+    if condition == "before":
+        return value < operand_date
+    if condition == "after":
+        return value >= day_end if whole_day else value > operand_date
+    if condition == "on_or_before":
+        return value < day_end if whole_day else value <= operand_date
+    if condition == "on_or_after":
+        return value >= operand_date
+    raise UnsupportedFilterError(f"Unsupported date condition {condition!r}")
+
+
+def _list_condition(value: List[Any], condition: str, operand: Any) -> bool:
+    if condition == "contains":
+        return operand in value
+    if condition == "does_not_contain":
+        return operand not in value
+    raise UnsupportedFilterError(f"Unsupported condition {condition!r}")
+
+
+_TEXT_TYPES = {"title", "rich_text", "url", "email", "phone_number", "string"}
+
+
+def _condition(value: Any, filter_type: str, condition: str, operand: Any, now: datetime) -> bool:
+    if condition == "is_empty":
+        return _is_empty(value)
+    if condition == "is_not_empty":
+        return not _is_empty(value)
+    if filter_type in _TEXT_TYPES:
+        return _text_condition(value, condition, operand)
+    if filter_type in ("number", "unique_id"):
+        return _number_condition(value, condition, operand)
+    if filter_type == "checkbox":
+        if condition == "equals":
+            return bool(value) == operand
+        if condition == "does_not_equal":
+            return bool(value) != operand
+        raise UnsupportedFilterError(f"Unsupported checkbox condition {condition!r}")
+    if filter_type in ("select", "status"):
+        if condition == "equals":
+            return value == operand
+        if condition == "does_not_equal":
+            return value != operand
+        raise UnsupportedFilterError(f"Unsupported {filter_type} condition {condition!r}")
+    if filter_type in ("multi_select", "people", "relation"):
+        return _list_condition(value or [], condition, operand)
+    if filter_type in ("date", "created_time", "last_edited_time"):
+        return _date_condition(value, condition, operand, now)
+    raise UnsupportedFilterError(f"Unsupported filter type {filter_type!r}")
+
+
+def _split_condition(filter_: Dict, keys: Set[str]) -> tuple:
+    filter_type = next((key for key in filter_ if key not in keys), None)
+    if filter_type is None or not isinstance(filter_[filter_type], dict) or len(filter_[filter_type]) != 1:
+        raise UnsupportedFilterError(f"Malformed filter {filter_!r}")
+    (condition, operand), = filter_[filter_type].items()
+    return filter_type, condition, operand
+
+
+def matches(entry: Dict, filter_: Optional[Dict], now: Optional[datetime] = None) -> bool:
+    """Evaluate a Notion database filter object against one entry."""
+    if not filter_:
+        return True
+    now = now or datetime.now(timezone.utc)
+    if "and" in filter_:
+        return all(matches(entry, sub_filter, now) for sub_filter in filter_["and"])
+    if "or" in filter_:
+        return any(matches(entry, sub_filter, now) for sub_filter in filter_["or"])
+    if "timestamp" in filter_:
+        timestamp = filter_["timestamp"]
+        _, condition, operand = _split_condition(filter_, {"timestamp"})
+        return _condition(_parse_date(entry.get(timestamp)), timestamp, condition, operand, now)
+
+    filter_type, condition, operand = _split_condition(filter_, {"property"})
+    value = property_value(entry, filter_["property"])
+    if filter_type == "formula":
+        filter_type, condition, operand = _split_condition(operand, set())
+    return _condition(value, filter_type, condition, operand, now)
+
+
+def sort_entries(entries: List[Dict], sorts: Optional[List[Dict]]) -> List[Dict]:
+    """Sort entries like Notion does, empty values last in either direction."""
+    entries = list(entries)
+    for sort in reversed(sorts or []):
+        if "timestamp" in sort:
+            def key_of(entry, timestamp=sort["timestamp"]):
+                return _parse_date(entry.get(timestamp))
+        elif "property" in sort:
+            def key_of(entry, name=sort["property"]):
+                value = property_value(entry, name)
+                return ", ".join(value) if isinstance(value, list) else value
+        else:
+            raise UnsupportedFilterError(f"Malformed sort {sort!r}")
+
+        descending = sort.get("direction", "ascending") == "descending"
+        present = [entry for entry in entries if not _is_empty(key_of(entry))]
+        empty = [entry for entry in entries if _is_empty(key_of(entry))]
+        present.sort(key=lambda entry: _sortable(key_of(entry)), reverse=descending)
+        entries = present + empty
+    return entries
+
+
+def _sortable(value: Any) -> Any:
+    return value.lower() if isinstance(value, str) else value
+
+
+# Property types create_index accepts, with the one condition their index can answer
+_INDEXABLE = {
+    "select": "equals",
+    "status": "equals",
+    "checkbox": "equals",
+    "number": "equals",
+    "multi_select": "contains",
+}
+
+# Loads the entries of a database together with the time they were fetched from Notion
+EntriesLoader = Callable[[], Tuple[List[Dict], datetime]]
+
+
+def _build_index(entries: List[Dict], property_name: str) -> Dict[Any, Set[int]]:
+    index: Dict[Any, Set[int]] = {}
+    for position, entry in enumerate(entries):
+        value = property_value(entry, property_name)
+        for item in value if isinstance(value, list) else [value]:
+            index.setdefault(item, set()).add(position)
+    return index
+
+
+class LocalQueryEngine:
+    """Answers filtered and sorted database queries from cached entries.
+
+    Entries are kept in memory per database with the indexes built over them. They are dropped when the cache
+    stores a new entries list for that database, or once they are older than the `max_age` of a query; the
+    indexes are rebuilt on the next load.
+    """
+
+    def __init__(self, cache: "NotionCache") -> None:
+        # database_id -> (entries, fetched at, {property: index})
+        self._entries: Dict[str, Tuple[List[Dict], datetime, Dict[str, Dict[Any, Set[int]]]]] = {}
+        # database_id -> {property: property type} of the indexes to build on load
+        self._indexed: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+        cache.add_listener(self._on_cache_change)
+
+    def _on_cache_change(self, key: str, previous: Optional[Dict], value: Optional[Dict]) -> None:
+        database_id = key[len("query:"):].split(":")[0] if key.startswith("query:") else key
+        if database_id in self._entries:
+            with self._lock:
+                self._entries.pop(database_id, None)
+
+    def _load(self, database_id: str, load_entries: EntriesLoader,
+              max_age: timedelta) -> Tuple[List[Dict], Dict[str, Dict[Any, Set[int]]]]:
+        with self._lock:
+            loaded = self._entries.get(database_id)
+        if loaded is None or datetime.now() - loaded[1] >= max_age:
+            entries, fetched_at = load_entries()
+            with self._lock:
+                indexed = dict(self._indexed.get(database_id, {}))
+            indexes = {name: _build_index(entries, name) for name in indexed}
+            loaded = (entries, fetched_at, indexes)
+            with self._lock:
+                self._entries[database_id] = loaded
+        return loaded[0], loaded[2]
+
+    def create_index(self, database_id: str, property_name: str, load_entries: EntriesLoader,
+                     max_age: timedelta) -> None:
+        """Index a select, status, checkbox or number property for `equals`, or a multi_select for `contains`."""
+        entries, indexes = self._load(database_id, load_entries, max_age)
+        property_type = next((entry["properties"][property_name]["type"] for entry in entries
+                              if property_name in entry.get("properties", {})), None)
+        if property_type not in _INDEXABLE:
+            raise UnsupportedFilterError(f"Can't index {property_name!r} of type {property_type!r}, only "
+                                         f"{', '.join(_INDEXABLE)} properties")
+        with self._lock:
+            self._indexed.setdefault(database_id, {})[property_name] = property_type
+        indexes[property_name] = _build_index(entries, property_name)
+
+    def _candidates(self, database_id: str, indexes: Dict[str, Dict[Any, Set[int]]],
+                    filter_: Optional[Dict]) -> Optional[Set[int]]:
+        # Narrow an `and` of indexed conditions down to the positions that can match
+        if not filter_ or not indexes:
+            return None
+        with self._lock:
+            indexed = dict(self._indexed.get(database_id, {}))
+        conditions = filter_["and"] if "and" in filter_ else [filter_]
+        candidates = None
+        for condition in conditions:
+            index = indexes.get(condition.get("property"))
+            if index is None:
+                continue
+            property_type = indexed[condition["property"]]
+            filter_type, name, operand = _split_condition(condition, {"property"})
+            if filter_type != property_type or name != _INDEXABLE[property_type]:
+                continue
+            positions = index.get(operand, set())
+            candidates = positions if candidates is None else candidates & positions
+        return candidates
+
+    def query(self, database_id: str, load_entries: EntriesLoader, max_age: timedelta,
+              filter: Optional[Dict] = None, sorts: Optional[List[Dict]] = None) -> List[Dict]:
+        """Filter and sort the entries from `load_entries`, reloading them once they are `max_age` old."""
+        entries, indexes = self._load(database_id, load_entries, max_age)
+        candidates = self._candidates(database_id, indexes, filter)
+        if candidates is not None:
+            entries = [entries[position] for position in sorted(candidates)]
+        now = datetime.now(timezone.utc)
+        result = [entry for entry in entries if matches(entry, filter, now)]
+        return deepcopy(sort_entries(result, sorts))
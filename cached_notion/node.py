@@ -0,0 +1,98 @@
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from notion_client import Client
+
+from cached_notion.cached_client import CachedClient
+from cached_notion.utils import retrieve_object
+
+
+class NotionNode(Mapping):
+    """Lazy view of a page, database or block, the opt-in result of `retrieve_all_content(..., lazy=True)`.
+
+    The object itself is retrieved on first key access, `children` and `entries` are listed on first access
+    and wrapped in nodes of their own. Nothing is copied into the parent, so `release()` or `walk()` can drop
+    a subtree once it has been visited and the cache stays the only full copy.
+    """
+
+    __slots__ = ("client", "id", "object_type", "_listed", "_data", "_children", "_entries")
+
+    def __init__(self, client: Union[Client, CachedClient], notion_id: str, object_type: str = "unknown",
+                 listed: Optional[Dict] = None) -> None:
+        self.client = client
+        self.id = notion_id
+        self.object_type = object_type
+        # The block or entry as it appeared in its parent's listing
+        self._listed = listed
+        self._data: Optional[Dict] = None
+        self._children: Optional[List["NotionNode"]] = None
+        self._entries: Optional[List["NotionNode"]] = None
+
+    @property
+    def data(self) -> Dict:
+        if self._data is None:
+            data = retrieve_object(self.client, self.id, self.object_type, self._listed)
+            self.client.logger.debug(f"Retrieved object: {self.id} {self.object_type}")
+            # Cached listings are served through the children and entries nodes instead
+            self._data = {key: value for key, value in data.items() if key not in ("children", "entries")}
+        return self._data
+
+    def __getitem__(self, key: str) -> Any:
+        return self.data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self) -> str:
+        return f"NotionNode({self.id!r}, {self.object_type!r})"
+
+    def _has_children(self) -> bool:
+        return self.data.get("has_children", False) or self.data.get("object", "") == "page"
+
+    def _has_entries(self) -> bool:
+        data = self.data
+        return data["object"] == "database" or data["object"] == "block" and data["type"] == "child_database"
+
+    @property
+    def children(self) -> List["NotionNode"]:
+        if self._children is None:
+            listed = self.client.blocks.children.list_all(self.id) if self._has_children() else []
+            self._children = [NotionNode(self.client, child["id"], child["type"], child) for child in listed]
+        return self._children
+
+    @property
+    def entries(self) -> List["NotionNode"]:
+        if self._entries is None:
+            listed = self.client.databases.query_all(self.id) if self._has_entries() else []
+            self._entries = [NotionNode(self.client, entry["id"], "page", entry) for entry in listed]
+        return self._entries
+
+    def release(self) -> None:
+        """Drop the loaded object and subtree, they are loaded again on the next access."""
+        self._data = self._children = self._entries = None
+
+    def walk(self, release: bool = True) -> Iterator["NotionNode"]:
+        """Yield this node and then every node below it, depth first.
+
+        With `release`, each subtree is released as soon as it has been walked, so memory stays bounded by
+        the listings along the current path instead of growing with the whole tree.
+        """
+        yield self
+        for child in self.children + self.entries:
+            yield from child.walk(release)
+            if release:
+                child.release()
+        if release:
+            self._children = self._entries = None
+
+    def to_dict(self) -> Dict:
+        """Materialize the subtree the way `retrieve_all_content` returns it."""
+        obj = dict(self.data)
+        if self._has_children():
+            obj["children"] = [child.to_dict() for child in self.children]
+        if self._has_entries():
+            obj["entries"] = [entry.to_dict() for entry in self.entries]
+        return obj
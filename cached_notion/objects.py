@@ -0,0 +1,13 @@
+from typing import Any, Dict, Optional
+
+
+def get_parent_id(notion_obj: Dict[Any, Any]) -> Optional[str]:
+    """The id of the page, database or block the object sits under, None for the workspace."""
+    parent = notion_obj.get("parent", {}) or {}
+    parent_id = parent.get(parent.get("type", ""))
+    return parent_id if isinstance(parent_id, str) else None
+
+
+def is_removed(notion_obj: Dict[Any, Any]) -> bool:
+    """Whether the object was archived or moved to the trash."""
+    return bool(notion_obj.get("archived", False) or notion_obj.get("in_trash", False))
@@ -0,0 +1,155 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+from notion_client.errors import APIErrorCode, APIResponseError, HTTPResponseError, RequestTimeoutError
+from tenacity import RetryCallState, Retrying, retry_if_exception, stop_after_attempt, wait_exponential
+
+RETRYABLE_API_CODES = {
+    APIErrorCode.RateLimited,
+    APIErrorCode.ConflictError,
+    APIErrorCode.InternalServerError,
+    APIErrorCode.ServiceUnavailable,
+}
+RETRYABLE_STATUS_CODES = {409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Notion while the circuit breaker is open."""
+
+    def __init__(self, endpoint: str, retry_in: float) -> None:
+        super().__init__(f"Circuit open, not calling {endpoint} for another {retry_in:.1f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Return True for rate limits, transient server errors and network failures."""
+    if isinstance(error, APIResponseError):
+        return error.code in RETRYABLE_API_CODES
+    if isinstance(error, HTTPResponseError):
+        return error.status in RETRYABLE_STATUS_CODES
+    return isinstance(error, (RequestTimeoutError, httpx.TransportError))
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive retryable failures and rejects calls for `reset_timeout` seconds.
+
+    Once the timeout has passed a single trial call is let through; it closes the circuit on success
+    and re-opens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 10, reset_timeout: float = 60.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def before_call(self, endpoint: str) -> None:
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._trial_running:
+                raise CircuitOpenError(endpoint, max(remaining, 0.0))
+            self._trial_running = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release(self) -> None:
+        # A non-retryable error says nothing about the health of the API, only end a pending trial
+        with self._lock:
+            self._trial_running = False
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds from the Retry-After header of an HTTP error response, None when there isn't one."""
+    if not isinstance(error, HTTPResponseError):
+        return None
+    try:
+        return float(error.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Retry classified Notion errors within a per-endpoint deadline, sharing one circuit breaker.
+
+    `deadlines` maps endpoint names such as "pages.retrieve" or "blocks.children.list" to the total
+    number of seconds a call may spend retrying, waits included; other endpoints use `default_deadline`.
+    A paginated listing shares one deadline across all of its pages, see `call_until`.
+    """
+
+    def __init__(
+            self,
+            max_attempts: int = 7,
+            default_deadline: float = 300.0,
+            deadlines: Optional[Dict[str, float]] = None,
+            min_wait: float = 1.0,
+            max_wait: float = 128.0,
+            circuit_breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.default_deadline = default_deadline
+        self.deadlines = deadlines or {}
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self._backoff = wait_exponential(multiplier=1, min=min_wait, max=max_wait)
+
+    def deadline_for(self, endpoint: str) -> float:
+        return self.deadlines.get(endpoint, self.default_deadline)
+
+    def deadline_at(self, endpoint: str) -> float:
+        """The time.monotonic() by which a call starting now has to give up."""
+        return time.monotonic() + self.deadline_for(endpoint)
+
+    def _wait(self, retry_state: RetryCallState, deadline_at: float) -> float:
+        delay = retry_after(retry_state.outcome.exception())
+        wait = min(delay, self.max_wait) if delay is not None else self._backoff(retry_state)
+        # Never sleep past the deadline, the attempt after the wait is the last one
+        return max(0.0, min(wait, deadline_at - time.monotonic()))
+
+    def _attempt(self, endpoint: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        self.circuit_breaker.before_call(endpoint)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if is_retryable(e):
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.release()
+            raise
+        self.circuit_breaker.record_success()
+        return result
+
+    def call(self, endpoint: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return self.call_until(self.deadline_at(endpoint), endpoint, func, *args, **kwargs)
+
+    def call_until(self, deadline_at: float, endpoint: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """`call` with a deadline taken from `deadline_at`, so that several calls can share one."""
+        retrying = Retrying(
+            retry=retry_if_exception(is_retryable),
+            stop=stop_after_attempt(self.max_attempts) | (lambda retry_state: time.monotonic() >= deadline_at),
+            wait=lambda retry_state: self._wait(retry_state, deadline_at),
+            reraise=True,
+        )
+        return retrying(self._attempt, endpoint, func, *args, **kwargs)
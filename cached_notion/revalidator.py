@@ -0,0 +1,45 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Hashable, Optional, Set
+
+
+class Revalidator:
+    """Runs cache refreshes on background threads, at most one in flight per key."""
+
+    def __init__(self, max_workers: int = 2, logger: Optional[logging.Logger] = None) -> None:
+        self.max_workers = max_workers
+        self.logger = logger or logging.getLogger(__name__)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight: Set[Hashable] = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, refresh: Callable[[], Any]) -> Optional[Future]:
+        with self._lock:
+            if key in self._in_flight:
+                return None
+            self._in_flight.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="cached-notion-revalidate")
+        future = self._executor.submit(self._run, key, refresh)
+        return future
+
+    def _run(self, key: Hashable, refresh: Callable[[], Any]) -> Any:
+        try:
+            return refresh()
+        except Exception as e:
+            self.logger.warning(f"Background refresh of {key} failed: {e!r}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+    def is_refreshing(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._in_flight
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,155 @@
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from cached_notion.cached_client import NotionCache
+from cached_notion.objects import get_parent_id
+from cached_notion.utils import _rich_text_to_md
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id TEXT PRIMARY KEY,
+    parent_id TEXT,
+    object TEXT,
+    last_edited_time TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(title, body, tokenize = 'unicode61');
+"""
+
+
+def _page_text(page: Dict) -> Tuple[str, str]:
+    from cached_notion.models.property import PropertiesModel
+
+    try:
+        properties = PropertiesModel.parse_properties(page.get("properties", {}))
+        return properties.get_title_md(), properties.get_property_md()
+    except Exception:
+        # Property types the models don't know yet, fall back to the plain title
+        for prop in page.get("properties", {}).values():
+            if prop.get("type") == "title":
+                return _rich_text_to_md(prop.get("title", [])), ""
+        return "", ""
+
+
+def _block_text(block: Dict) -> Tuple[str, str]:
+    data = block.get(block.get("type", ""), {}) or {}
+    if "title" in data:
+        return data["title"], ""
+    if "cells" in data:
+        return "", " | ".join(_rich_text_to_md(cell) for cell in data["cells"])
+    return "", _rich_text_to_md(data.get("rich_text", []) or data.get("caption", []))
+
+
+def extract_text(notion_obj: Dict) -> Tuple[str, str]:
+    """Title and body text of a cached page, database or block."""
+    if notion_obj.get("object") == "page":
+        return _page_text(notion_obj)
+    if notion_obj.get("object") == "database":
+        return _rich_text_to_md(notion_obj.get("title", [])), _rich_text_to_md(notion_obj.get("description", []))
+    return _block_text(notion_obj)
+
+
+def _match_expression(query: str) -> str:
+    # Quote every term so user input can't be read as FTS5 query syntax
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in query.split())
+
+
+class SearchIndex:
+    """SQLite FTS5 index over cached pages, databases and blocks, kept up to date on every cache set."""
+
+    def __init__(self, path: str = "notion_search.sqlite") -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def attach(self, cache: NotionCache) -> None:
+        cache.add_listener(self._on_cache_change)
+
+    def _on_cache_change(self, notion_id: str, previous: Optional[Dict], value: Optional[Dict]) -> None:
+        if value is None:
+            self.remove(notion_id)
+        elif isinstance(value, dict) and value.get("object") in ("page", "database", "block"):
+            self.add(value)
+
+    def add(self, notion_obj: Dict) -> bool:
+        """Index an object unless the index already has this last_edited_time of it."""
+        notion_id = notion_obj["id"]
+        if notion_obj.get("archived", False) or notion_obj.get("in_trash", False):
+            self.remove(notion_id)
+            return True
+
+        last_edited_time = notion_obj.get("last_edited_time")
+        with self._lock:
+            row = self._conn.execute("SELECT last_edited_time FROM docs WHERE id = ?", (notion_id,)).fetchone()
+            if row is not None and row[0] == last_edited_time:
+                return False
+            is_child_page = notion_obj.get("type") in ("child_page", "child_database")
+            if row is not None and is_child_page:
+                # Shares its id with the page or database itself, which has the richer text
+                return False
+
+            title, body = extract_text(notion_obj)
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO docs (id, parent_id, object, last_edited_time) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET parent_id = excluded.parent_id, object = excluded.object, "
+                    "last_edited_time = excluded.last_edited_time",
+                    # A child_page block leaves last_edited_time empty so that the page itself replaces it
+                    (notion_id, get_parent_id(notion_obj), "page" if is_child_page else notion_obj.get("object"),
+                     None if is_child_page else last_edited_time),
+                )
+                rowid = self._conn.execute("SELECT rowid FROM docs WHERE id = ?", (notion_id,)).fetchone()[0]
+                self._conn.execute("DELETE FROM fts WHERE rowid = ?", (rowid,))
+                self._conn.execute("INSERT INTO fts (rowid, title, body) VALUES (?, ?, ?)", (rowid, title, body))
+        return True
+
+    def remove(self, notion_id: str) -> None:
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT rowid FROM docs WHERE id = ?", (notion_id,)).fetchone()
+            if row is not None:
+                self._conn.execute("DELETE FROM fts WHERE rowid = ?", row)
+                self._conn.execute("DELETE FROM docs WHERE rowid = ?", row)
+
+    def rebuild(self, cache: NotionCache) -> int:
+        """Index everything already in the cache, returns the number of objects (re)indexed."""
+        indexed = 0
+        for _, value in cache.items():
+            if isinstance(value, dict) and value.get("object") in ("page", "database", "block"):
+                indexed += self.add(value)
+        return indexed
+
+    def _page_of(self, notion_id: str) -> str:
+        seen = set()
+        current = notion_id
+        while current not in seen:
+            seen.add(current)
+            row = self._conn.execute("SELECT parent_id, object FROM docs WHERE id = ?", (current,)).fetchone()
+            if row is None or row[1] in ("page", "database") or row[0] is None:
+                return current
+            current = row[0]
+        return current
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Ranked page ids with a snippet of their best matching page, database or block."""
+        expression = _match_expression(query)
+        if not expression:
+            return []
+
+        results: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT docs.id, snippet(fts, -1, '**', '**', '…', 16), bm25(fts) FROM fts "
+                "JOIN docs ON docs.rowid = fts.rowid WHERE fts MATCH ? ORDER BY bm25(fts) LIMIT ?",
+                (expression, limit * 10),
+            ).fetchall()
+            for notion_id, snippet, score in rows:
+                page_id = self._page_of(notion_id)
+                if page_id not in results:
+                    results[page_id] = {"page_id": page_id, "id": notion_id, "snippet": snippet, "score": -score}
+                if len(results) >= limit:
+                    break
+        return list(results.values())
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import mmap
+import struct
+import zlib
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple, Union
+
+from cached_notion.cached_api_endpoints import to_timedelta
+from cached_notion.cached_client import MemoryCache, NotionCache
+
+# A snapshot is the magic, one zlib-compressed JSON record per cache key, a compressed JSON index of
+# {key: [offset, length, last_edited_time]} and a footer with the index position and a sha256 of all of it.
+MAGIC = b"CNSNAP1\n"
+_FOOTER = struct.Struct("<QQ32s")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _reachable(cache: NotionCache, roots: Iterable[str]) -> Set[str]:
+    keys: Set[str] = set()
+    stack = list(roots)
+    while stack:
+        notion_id = stack.pop()
+        if notion_id in keys:
+            continue
+        obj = cache.get(notion_id)
+        if not isinstance(obj, dict):
+            continue
+        keys.add(notion_id)
+        stack += [child["id"] for child in obj.get("children", []) or []]
+        stack += [entry["id"] for entry in obj.get("entries", []) or []]
+        if obj.get("object") == "database":
+            for query_key in cache.get(f"query:{notion_id}", []) or []:
+                keys.add(query_key)
+            keys.add(f"query:{notion_id}")
+    return keys
+
+
+def _snapshot_items(cache: NotionCache, roots: Optional[Iterable[str]],
+                    max_age: timedelta) -> Iterator[Tuple[str, Any]]:
+    if roots is None:
+        items = iter(cache.items())
+    else:
+        items = ((key, cache.get(key)) for key in sorted(_reachable(cache, roots)))
+    for key, value in items:
+        # Checkpoints of interrupted listings only make sense on the node that wrote them
+        if value is None or key.startswith("checkpoint:"):
+            continue
+        # Blocks and entries stored from a listing have no cached_time of their own, they go with their parent
+        if isinstance(value, dict) and "cached_time" in value and NotionCache.age_of(value) > max_age:
+            continue
+        yield key, value
+
+
+def export_snapshot(cache: NotionCache, path: str, roots: Optional[Iterable[str]] = None,
+                    max_age: Optional[Union[timedelta, int]] = None, level: int = 6) -> int:
+    """Write the cache, or the part of it reachable from `roots`, to a compressed snapshot file.
+
+    Entries cached longer than `max_age` ago (hours when an int) are left out. Returns the number of entries.
+    """
+    max_age = to_timedelta(max_age, timedelta.max)
+    digest = hashlib.sha256()
+    index: Dict[str, list] = {}
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        offset = len(MAGIC)
+        for key, value in _snapshot_items(cache, roots, max_age):
+            record = zlib.compress(json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode(), level)
+            last_edited_time = value.get("last_edited_time") if isinstance(value, dict) else None
+            index[key] = [offset, len(record), last_edited_time]
+            f.write(record)
+            digest.update(record)
+            offset += len(record)
+
+        index_bytes = zlib.compress(json.dumps(index, separators=(",", ":")).encode(), level)
+        f.write(index_bytes)
+        digest.update(index_bytes)
+        f.write(_FOOTER.pack(offset, len(index_bytes), digest.digest()))
+    return len(index)
+
+
+class SnapshotReader:
+    """Memory-mapped, read-only view of a snapshot file. Records are decompressed on access."""
+
+    def __init__(self, path: str, verify: bool = True) -> None:
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SnapshotError(f"{path} is empty, not a snapshot")
+        try:
+            self.index = self._read_index(verify)
+        except Exception:
+            self.close()
+            raise
+
+    def _read_index(self, verify: bool) -> Dict[str, list]:
+        data = self._mmap
+        if len(data) < len(MAGIC) + _FOOTER.size or data[:len(MAGIC)] != MAGIC:
+            raise SnapshotError(f"{self.path} is not a snapshot")
+        index_offset, index_length, checksum = _FOOTER.unpack(data[-_FOOTER.size:])
+        if index_offset + index_length != len(data) - _FOOTER.size:
+            raise SnapshotError(f"{self.path} is truncated")
+        if verify and hashlib.sha256(data[len(MAGIC):index_offset + index_length]).digest() != checksum:
+            raise SnapshotError(f"{self.path} is corrupted, checksum mismatch")
+        return json.loads(zlib.decompress(data[index_offset:index_offset + index_length]))
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def get(self, key: str, default=None):
+        location = self.index.get(key)
+        if location is None:
+            return default
+        offset, length, _ = location
+        return json.loads(zlib.decompress(self._mmap[offset:offset + length]))
+
+    def last_edited_time(self, key: str) -> Optional[str]:
+        return self.index[key][2]
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        for key in self.index:
+            yield key, self.get(key)
+
+    def close(self) -> None:
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._file.close()
+
+
+def _is_newer(snapshot_value: Any, local_value: Any) -> bool:
+    if local_value is None:
+        return True
+    if not isinstance(snapshot_value, dict) or not isinstance(local_value, dict):
+        return False
+    snapshot_time, local_time = snapshot_value.get("last_edited_time"), local_value.get("last_edited_time")
+    if snapshot_time and local_time and snapshot_time != local_time:
+        return snapshot_time > local_time
+    # Same edit or no edit time at all, keep whichever was fetched last
+    return snapshot_value.get("cached_time", "") > local_value.get("cached_time", "")
+
+
+def import_snapshot(cache: NotionCache, path: str, verify: bool = True) -> int:
+    """Merge a snapshot into the cache, keeping whichever side has the newer `last_edited_time`.
+
+    Returns the number of entries taken from the snapshot.
+    """
+    reader = SnapshotReader(path, verify=verify)
+    imported = 0
+    try:
+        for key, value in reader.items():
+            if _is_newer(value, cache.get(key)):
+                cache.set(key, value)
+                imported += 1
+    finally:
+        reader.close()
+    return imported
+
+
+class SnapshotCache(NotionCache):
+    """Serves a shipped snapshot directly, without importing it first.
+
+    Reads are answered from the memory-mapped snapshot unless the `overlay` cache has a newer copy. The
+    snapshot file itself is never written, writes go to the overlay, which defaults to a `MemoryCache`.
+    """
+
+    def __init__(self, path: str, overlay: Optional[NotionCache] = None, verify: bool = True) -> None:
+        self.path = path
+        self.snapshot = SnapshotReader(path, verify=verify)
+        self.overlay = overlay if overlay is not None else MemoryCache()
+        self._deleted: Set[str] = set()
+
+    def get(self, notion_id, default=None):
+        if notion_id in self._deleted:
+            return default
+        local = self.overlay.get(notion_id)
+        if notion_id not in self.snapshot:
+            return default if local is None else local
+        if local is not None and (not isinstance(local, dict) or
+                                  local.get("last_edited_time") == self.snapshot.last_edited_time(notion_id)):
+            # Written since the snapshot was taken, or unchanged with a more recent cached_time
+            return local
+        value = self.snapshot.get(notion_id)
+        return value if _is_newer(value, local) else local
+
+    def set(self, notion_id, value):
+        previous = self.get(notion_id) if self.__dict__.get("listeners") else None
+        self.overlay.set(notion_id, value)
+        self._deleted.discard(notion_id)
+        self._notify(notion_id, previous, value)
+
+    def delete(self, notion_id):
+        previous = self.get(notion_id) if self.__dict__.get("listeners") else None
+        self.overlay.delete(notion_id)
+        if notion_id in self.snapshot:
+            self._deleted.add(notion_id)
+        self._notify(notion_id, previous, None)
+
+    def items(self):
+        for key in self.snapshot.index:
+            value = self.get(key)
+            if value is not None:
+                yield key, value
+        for key, value in self.overlay.items():
+            if key not in self.snapshot:
+                yield key, value
+
+    def close(self) -> None:
+        self.snapshot.close()
@@ -0,0 +1,33 @@
+import threading
+from collections import Counter
+from typing import Dict
+
+
+class CacheStats:
+    """Thread-safe counters of cache hits, misses and requests sent to Notion."""
+
+    def __init__(self) -> None:
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[kind] += n
+
+    def __getitem__(self, kind: str) -> int:
+        with self._lock:
+            return self._counts[kind]
+
+    @property
+    def hit_rate(self) -> float:
+        with self._lock:
+            lookups = self._counts["hits"] + self._counts["misses"]
+            return self._counts["hits"] / lookups if lookups else 0.0
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Set
+
+from notion_client.errors import APIErrorCode, APIResponseError
+
+from cached_notion.retry_policy import retry_after
+
+# Errors that say the token can't see the object, another integration may still have access to it
+ACCESS_ERROR_CODES = {
+    APIErrorCode.ObjectNotFound,
+    APIErrorCode.RestrictedResource,
+    APIErrorCode.Unauthorized,
+}
+
+
+def object_key(path: str) -> Optional[str]:
+    """The id of the object a request path is about, e.g. the database of "databases/<id>/query"."""
+    parts = path.strip("/").split("/")
+    return parts[1] if len(parts) > 1 else None
+
+
+class _TokenState:
+    def __init__(self, token: str) -> None:
+        self.token = token
+        # Theoretical arrival time of the next request on this token, see TokenPool.acquire
+        self.next_at = 0.0
+        self.calls = 0
+        self.rate_limited = 0
+        self.denied = 0
+
+
+class TokenPool:
+    """Spreads requests over several integration tokens with access to the same workspace.
+
+    Every token gets its own budget of `rate` requests per second, with bursts of up to `burst` requests.
+    Each request goes to the token that can send it soonest. A rate-limited token is rested for its
+    Retry-After while the request moves on to another token, and a token that can't access an object
+    hands the request to the next token before the error is raised. Which tokens were denied an object is
+    remembered for the last `remember_denials` objects, so later requests for it skip those tokens.
+    """
+
+    def __init__(self, tokens: Iterable[str], rate: float = 3.0, burst: int = 3,
+                 remember_denials: int = 10_000) -> None:
+        self._states = [_TokenState(token) for token in dict.fromkeys(tokens)]
+        if not self._states:
+            raise ValueError("TokenPool needs at least one token")
+        self.interval = 1.0 / rate
+        self.burst = burst
+        self.remember_denials = remember_denials
+        # Object key -> tokens that were denied access to it, least recently used first
+        self._denials: "OrderedDict[Hashable, Set[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def acquire(self, exclude: Optional[Set[str]] = None) -> str:
+        """Reserve the earliest free slot among the tokens not in `exclude`, sleeping until it comes."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [state for state in self._states if not exclude or state.token not in exclude]
+            state = min(candidates, key=lambda candidate: max(candidate.next_at, now))
+            # Generic cell rate algorithm: up to `burst` requests may run ahead of the steady rate
+            start = max(state.next_at, now)
+            wait = max(0.0, start - (self.burst - 1) * self.interval - now)
+            state.next_at = start + self.interval
+            state.calls += 1
+        if wait > 0:
+            time.sleep(wait)
+        return state.token
+
+    def _state(self, token: str) -> _TokenState:
+        return next(state for state in self._states if state.token == token)
+
+    def rest(self, token: str, seconds: float) -> None:
+        with self._lock:
+            state = self._state(token)
+            state.rate_limited += 1
+            state.next_at = max(state.next_at, time.monotonic() + seconds)
+
+    def _known_denials(self, key: Optional[Hashable]) -> Set[str]:
+        with self._lock:
+            denied = self._denials.get(key, set()) if key is not None else set()
+            if key in self._denials:
+                self._denials.move_to_end(key)
+            # Once every token was denied, access may have been granted since, so try them all again
+            return set() if len(denied) >= len(self._states) else set(denied)
+
+    def _remember_denial(self, key: Optional[Hashable], token: str) -> None:
+        with self._lock:
+            self._state(token).denied += 1
+            if key is None or not self.remember_denials:
+                return
+            self._denials.setdefault(key, set()).add(token)
+            self._denials.move_to_end(key)
+            while len(self._denials) > self.remember_denials:
+                self._denials.popitem(last=False)
+
+    def call(self, send: Callable[[str], Any], key: Optional[Hashable] = None) -> Any:
+        """Call `send(token)` with pooled tokens until one succeeds or no token is left to try.
+
+        `key` names the object the request is about, tokens denied access to it before are skipped.
+        """
+        denied = self._known_denials(key)
+        rate_limited = 0
+        while True:
+            token = self.acquire(exclude=denied)
+            try:
+                return send(token)
+            except APIResponseError as e:
+                if e.code == APIErrorCode.RateLimited:
+                    self.rest(token, retry_after(e) or 1.0)
+                    rate_limited += 1
+                    # Once every token was limited, let the retry policy back off
+                    if rate_limited >= len(self._states) - len(denied):
+                        raise
+                elif e.code in ACCESS_ERROR_CODES:
+                    self._remember_denial(key, token)
+                    denied.add(token)
+                    if len(denied) == len(self._states):
+                        raise
+                else:
+                    raise
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Per-token counters, keyed by the last characters of the token."""
+        with self._lock:
+            return {
+                f"...{state.token[-4:]}": {
+                    "calls": state.calls, "rate_limited": state.rate_limited, "denied": state.denied,
+                }
+                for state in self._states
+            }
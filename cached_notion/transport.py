@@ -0,0 +1,69 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict
+
+import httpx
+
+_ENDPOINT_PATTERNS = [
+    ("GET", re.compile(r"^blocks/[^/]+/children$"), "blocks.children.list"),
+    ("PATCH", re.compile(r"^blocks/[^/]+/children$"), "blocks.children.append"),
+    ("POST", re.compile(r"^databases/[^/]+/query$"), "databases.query"),
+    ("GET", re.compile(r"^pages/[^/]+/properties/[^/]+$"), "pages.properties.retrieve"),
+    ("GET", re.compile(r"^(blocks|pages|databases|users)/[^/]+$"), "{}.retrieve"),
+    ("PATCH", re.compile(r"^(blocks|pages|databases)/[^/]+$"), "{}.update"),
+    ("DELETE", re.compile(r"^blocks/[^/]+$"), "blocks.delete"),
+    ("POST", re.compile(r"^(pages|databases|comments)$"), "{}.create"),
+    ("POST", re.compile(r"^search$"), "search"),
+]
+
+
+def endpoint_name(method: str, path: str) -> str:
+    """Name a request the way RetryPolicy deadlines and HTTPOptions timeouts are keyed, e.g. "pages.retrieve"."""
+    path = path.strip("/")
+    for pattern_method, pattern, name in _ENDPOINT_PATTERNS:
+        match = pattern.match(path)
+        if pattern_method == method and match:
+            return name.format(*match.groups())
+    return f"{method} {path}"
+
+
+@dataclass
+class HTTPOptions:
+    """Connection pool and timeout settings of the httpx client a CachedClient builds for itself.
+
+    Attributes:
+        max_connections: Upper bound of open connections, size it to the number of parallel workers.
+        max_keepalive_connections: Idle connections kept open for reuse.
+        keepalive_expiry: Seconds an idle connection is kept alive.
+        http2: Multiplex requests over HTTP/2, needs the optional `h2` package.
+        connect_timeout: Seconds to wait for a new connection.
+        timeouts: Read timeouts in seconds per endpoint name, e.g. {"databases.query": 120}. Other endpoints
+            use the client's `timeout_ms`.
+    """
+
+    max_connections: int = 32
+    max_keepalive_connections: int = 32
+    keepalive_expiry: float = 60.0
+    http2: bool = False
+    connect_timeout: float = 5.0
+    timeouts: Dict[str, float] = field(default_factory=dict)
+
+
+def build_http_client(options: HTTPOptions) -> httpx.Client:
+    # gzip and deflate are always decoded by httpx, brotli as soon as the `brotli` package is installed
+    limits = httpx.Limits(
+        max_connections=options.max_connections,
+        max_keepalive_connections=options.max_keepalive_connections,
+        keepalive_expiry=options.keepalive_expiry,
+    )
+    try:
+        return httpx.Client(limits=limits, http2=options.http2)
+    except ImportError:
+        logging.getLogger(__name__).warning("HTTP/2 needs `pip install httpx[http2]`, using HTTP/1.1")
+        return httpx.Client(limits=limits)
+
+
+def request_timeout(options: HTTPOptions, default: float, method: str, path: str) -> httpx.Timeout:
+    read = options.timeouts.get(endpoint_name(method, path), default)
+    return httpx.Timeout(read, connect=min(options.connect_timeout, read))
@@ -1,18 +1,20 @@
 import logging
 import os
+import threading
 from collections import defaultdict
-from pprint import pprint
 from typing import List
 from typing import Tuple, Union, Optional, Dict
 from urllib.parse import urlparse, parse_qs
 from uuid import UUID
 
-import tqdm
 from notion_client import Client
+from notion_client.errors import APIErrorCode, APIResponseError
 
 from cached_notion.cached_client import CachedClient
-from cached_notion.models.property import PropertiesModel
-from cached_notion.pretty_logger import setup_logger
+from cached_notion.fingerprint import expand_cached, node_fingerprint
+
+# tqdm, pprint, coloredlogs and the pydantic property models are imported where they are used, so that
+# importing this module for the cache helpers doesn't pay for the markdown conversion.
 
 
 def normalize_url(url: str) -> str:
@@ -70,6 +72,10 @@ def retrieve_object(
     if object_type == "unknown" and isinstance(client, CachedClient):
         # get type if object is cached
         object_type = client.cache.get_object_type(notion_id)
+    if given_block is None and getattr(client, "trust_listings", False) and \
+            client.cache.is_recently_cached(notion_id, client.cache_delta):
+        # Trusting listings, whatever was cached within cache_delta is fresh, e.g. a listed database entry
+        given_block = client.cache.get(notion_id)
     if object_type == "unknown" and given_block is not None:
         # get type if object is given
         object_type = given_block["type"]
@@ -82,26 +88,30 @@ def retrieve_object(
         return client.blocks.retrieve(notion_id, cached=given_block)
     else:
         # TODO: Handle this better
-        try:
-            return client.pages.retrieve(notion_id, cached=given_block)
-        except:
-            pass
-        try:
-            return client.databases.retrieve(notion_id, cached=given_block)
-        except:
-            pass
-        try:
-            return client.blocks.retrieve(notion_id, cached=given_block)
-        except:
-            pass
-        raise Exception(f"Could not retrieve object with ID {notion_id}")
+        error = None
+        for endpoint in (client.pages, client.databases, client.blocks):
+            try:
+                return endpoint.retrieve(notion_id, cached=given_block)
+            except APIResponseError as e:
+                # Only "not a page" style errors mean another endpoint may know the id
+                if e.code not in (APIErrorCode.ObjectNotFound, APIErrorCode.ValidationError):
+                    raise
+                error = e
+        raise Exception(f"Could not retrieve object with ID {notion_id}") from error
 
 
 def retrieve_all_content(
         client: Union[Client, CachedClient],
         notion_id: str,
         object_type: str = "unknown",
-        given_block: Optional[Dict] = None):
+        given_block: Optional[Dict] = None,
+        skip_unchanged: bool = False,
+        lazy: bool = False):
+    if lazy:
+        from cached_notion.node import NotionNode
+        return NotionNode(client, notion_id, object_type, given_block)
+    if skip_unchanged:
+        return _retrieve_changed_content(client, notion_id, object_type, given_block)
     notion_obj = retrieve_object(client, notion_id, object_type, given_block)
     client.logger.debug(f"Retrieved object: {notion_id} {object_type}")
     if notion_obj.get("has_children", False) or notion_obj.get("object", "") == "page":
@@ -118,6 +128,61 @@ def retrieve_all_content(
     return notion_obj
 
 
+def _is_page_like(notion_obj: Dict) -> bool:
+    return notion_obj.get("object") in ("page", "database") or \
+        notion_obj.get("type") in ("child_page", "child_database")
+
+
+def _retrieve_changed_content(
+        client: CachedClient,
+        notion_id: str,
+        object_type: str = "unknown",
+        given_block: Optional[Dict] = None,
+        page_unchanged: bool = False):
+    """retrieve_all_content that stops descending into subtrees whose fingerprint is confirmed unchanged.
+
+    Editing a block changes the last_edited_time of the page it sits on, but not of its parent blocks.
+    So pages and databases are re-checked against Notion, and the blocks of an unchanged page are rebuilt
+    from the cache. Database entries are re-queried as entry edits don't touch the database itself.
+    """
+    previous = client.cache.get(notion_id)
+    if page_unchanged and previous and previous.get("fingerprint") and not _is_page_like(previous):
+        return expand_cached(client.cache, notion_id)
+
+    if given_block is not None and given_block.get("type") in ("child_page", "child_database"):
+        if client.cache.is_recently_cached(notion_id, client.cache_delta):
+            notion_obj = previous
+        else:
+            # The listed block may be older than the page itself, fetch the page to see its edit time
+            notion_obj = retrieve_object(client, notion_id, object_type)
+    else:
+        notion_obj = retrieve_object(client, notion_id, object_type, given_block)
+    client.logger.debug(f"Retrieved object: {notion_id} {object_type}")
+
+    if _is_page_like(notion_obj):
+        page_unchanged = bool(previous and previous.get("fingerprint")
+                              and previous.get("last_edited_time") == notion_obj.get("last_edited_time"))
+
+    child_fingerprints = []
+    if notion_obj.get("has_children", False) or notion_obj.get("object", "") == "page":
+        notion_obj["children"] = client.blocks.children.list_all(notion_id, refresh=not page_unchanged)
+        for child in notion_obj["children"]:
+            content = _retrieve_changed_content(client, child["id"], child["type"], child, page_unchanged)
+            child.update(content)
+            child_fingerprints.append(child.get("fingerprint", ""))
+    if notion_obj["object"] == "database" or notion_obj["object"] == "block" and notion_obj["type"] == "child_database":
+        entries = client.databases.query_all(notion_id, refresh=True)
+        notion_obj["entries"] = entries
+        for entry in entries:
+            content = _retrieve_changed_content(client, entry["id"], "page", entry)
+            entry.update(content)
+            child_fingerprints.append(entry.get("fingerprint", ""))
+
+    notion_obj["fingerprint"] = node_fingerprint(notion_obj, child_fingerprints)
+    client.cache.set_fingerprint(notion_id, notion_obj["fingerprint"])
+    return notion_obj
+
+
 def retrieve_page(
         client: Union[Client, CachedClient],
         notion_id: str,
@@ -138,6 +203,8 @@ def retrieve_page(
 
 
 def _get_page_info(d):
+    from cached_notion.models.property import PropertiesModel
+
     res = dict()
     try:
         properties = PropertiesModel.parse_properties(d.get('properties', {}))
@@ -188,7 +255,13 @@ def _rich_text_to_md(rich_text_list):
     return "".join(md_text)
 
 
-_numbered: defaultdict = defaultdict(int)
+class _Numbering(threading.local):
+    # Per-thread so that pages can be converted in parallel
+    def __init__(self):
+        self.counts: defaultdict = defaultdict(int)
+
+
+_numbered = _Numbering()
 
 
 def _code_block_to_md(block):
@@ -270,8 +343,8 @@ def _convert_block(notion_client, block: Dict, subs: List[Dict[str, str]], depth
     elif block_type == "toggle":
         res += f"> {_rich_text_to_md(block['toggle']['rich_text'])}\n"
     elif block_type == "numbered_list_item":
-        _numbered[depth] += 1
-        res += f"{_numbered[depth]}. {_rich_text_to_md(block['numbered_list_item']['rich_text'])}\n"
+        _numbered.counts[depth] += 1
+        res += f"{_numbered.counts[depth]}. {_rich_text_to_md(block['numbered_list_item']['rich_text'])}\n"
     elif block_type == "bulleted_list_item":
         res += f"* {_rich_text_to_md(block['bulleted_list_item']['rich_text'])}\n"
     elif block_type == "link_to_page":
@@ -291,7 +364,7 @@ def _convert_block(notion_client, block: Dict, subs: List[Dict[str, str]], depth
         res += f"{'[v]' if checked else '[ ]'} {text}\n"
 
     else:
-        _numbered[depth] = 0
+        _numbered.counts[depth] = 0
         if block_type not in {"column_list", "column", "image", "unsupported", "synced_block", "table_of_contents",
                               "file", "audio", "video", "link_preview", "embed"}:
             print(">>>>>>>>>>>>", block_type, block['id'])
@@ -304,6 +377,8 @@ def _convert_block(notion_client, block: Dict, subs: List[Dict[str, str]], depth
 
 
 def _convert_entries(entries):
+    from cached_notion.models.property import PropertiesModel
+
     res = []
     for entry in entries:
         properties = entry["properties"]
@@ -315,8 +390,7 @@ def _convert_entries(entries):
 
 # notion
 def _traverse(notion_client, d, depth=0):
-    global _numbered
-    _numbered = defaultdict(int)
+    _numbered.counts = defaultdict(int)
     res = []
     subs = []
     if d.get("object", "") == "page":
@@ -370,6 +444,8 @@ def url_to_md(notion_client, notion_url: str, max_depth: int = -1) -> Tuple[str,
 
 
 def id_to_md(notion_client, res, subs, max_depth, cur_depth=0):
+    import tqdm
+
     new_subs = []
     for sub in tqdm.tqdm(subs):
         notion_id = sub["id"]
@@ -378,12 +454,47 @@ def id_to_md(notion_client, res, subs, max_depth, cur_depth=0):
         r, s = _traverse(notion_client, content)
         res += r
         new_subs += s
-    if cur_depth < max_depth or max_depth == -1:
+    if new_subs and (cur_depth < max_depth or max_depth == -1):
         res, new_subs = id_to_md(notion_client, res, new_subs, max_depth, cur_depth + 1)
     return res, new_subs
 
 
+def _collect_subs(notion_obj: Dict) -> List[Dict[str, str]]:
+    subs = []
+    for child in notion_obj.get("children", []) or []:
+        if child.get("type") == "child_page":
+            subs.append({"type": "page", "id": child["id"]})
+        else:
+            subs += _collect_subs(child)
+    for entry in notion_obj.get("entries", []) or []:
+        subs.append({"type": "page", "id": entry["id"]})
+    return subs
+
+
+def warm_cache(notion_client: CachedClient, notion_url: str, max_depth: int = -1) -> int:
+    """Crawl a Notion URL and its sub pages into the cache without rendering Markdown.
+    max_depth: -1 means no limit. Returns the number of pages crawled."""
+
+    notion_id, object_type = get_id_with_object_type(normalize_url(notion_url))
+    subs = [{"type": object_type, "id": notion_id}]
+    seen = set()
+    depth = 0
+    while subs and (depth <= max_depth or max_depth == -1):
+        new_subs = []
+        for sub in subs:
+            if sub["id"] in seen:
+                continue
+            seen.add(sub["id"])
+            new_subs += _collect_subs(retrieve_page(notion_client, sub["id"], sub["type"]))
+        subs = new_subs
+        depth += 1
+    return len(seen)
+
+
 def _main():
+    from pprint import pprint
+    from cached_notion.pretty_logger import setup_logger
+
     logger = setup_logger(__name__)
     notion_client = CachedClient(
         auth=os.environ["NOTION_TOKEN"],
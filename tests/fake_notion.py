@@ -0,0 +1,199 @@
+import json
+import logging
+import re
+import threading
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+import httpx
+
+from cached_notion.cached_client import CachedClient, MemoryCache
+
+T = "2024-01-01T00:00:00.000Z"
+
+
+def rich_text(text: str) -> List[Dict]:
+    return [{"type": "text", "text": {"content": text, "link": None}, "plain_text": text, "href": None,
+             "annotations": {"bold": False, "italic": False, "strikethrough": False, "underline": False,
+                             "code": False, "color": "default"}}]
+
+
+class FakeNotion:
+    """In-memory Notion API served through httpx.MockTransport, counting requests per method and path."""
+
+    def __init__(self, page_size: int = 2) -> None:
+        self.objects: Dict[str, Dict] = {}
+        self.children: Dict[str, List[Dict]] = {}
+        self.entries: Dict[str, List[Dict]] = {}
+        self.errors: Dict[str, List[Dict]] = {}
+        self.calls: Counter = Counter()
+        self.edits = 0
+        # Ids each token is not shared with, and the requests sent with each token
+        self.hidden: Dict[str, Set[str]] = {}
+        self.token_calls: Counter = Counter()
+        self.page_size = page_size
+        # When set, every request waits for it, to hold requests in flight
+        self.gate: Optional[threading.Event] = None
+
+    def page(self, title: str, parent: Optional[Dict] = None, properties: Optional[Dict] = None) -> str:
+        page_id = str(uuid.uuid4())
+        props = {"Name": {"id": "title", "type": "title", "title": rich_text(title)}, **(properties or {})}
+        self.objects[page_id] = {"object": "page", "id": page_id, "created_time": T, "last_edited_time": T,
+                                 "parent": parent or {"type": "workspace", "workspace": True}, "archived": False,
+                                 "properties": props, "url": f"https://www.notion.so/{page_id.replace('-', '')}"}
+        self.children[page_id] = []
+        if parent and parent.get("type") == "page_id":
+            self.children[parent["page_id"]].append({
+                "object": "block", "id": page_id, "type": "child_page", "child_page": {"title": title},
+                "created_time": T, "last_edited_time": T, "parent": parent, "archived": False, "has_children": True,
+            })
+        return page_id
+
+    def database(self, parent_page: str, properties: Dict[str, str]) -> str:
+        database_id = str(uuid.uuid4())
+        self.objects[database_id] = {
+            "object": "database", "id": database_id, "title": rich_text("DB"), "created_time": T,
+            "last_edited_time": T, "parent": {"type": "page_id", "page_id": parent_page}, "url": "",
+            "properties": {name: {"id": name, "name": name, "type": prop_type}
+                           for name, prop_type in properties.items()},
+        }
+        self.entries[database_id] = []
+        self.children[parent_page].append({
+            "object": "block", "id": database_id, "type": "child_database", "child_database": {"title": "DB"},
+            "created_time": T, "last_edited_time": T, "parent": {"type": "page_id", "page_id": parent_page},
+            "archived": False, "has_children": False,
+        })
+        return database_id
+
+    def entry(self, database_id: str, title: str, properties: Dict) -> str:
+        entry_id = self.page(title, {"type": "database_id", "database_id": database_id}, properties)
+        self.entries[database_id].append(self.objects[entry_id])
+        return entry_id
+
+    def block(self, parent_id: str, text: str, children: bool = False) -> str:
+        block_id = str(uuid.uuid4())
+        parent_type = "page_id" if self.objects[parent_id]["object"] == "page" else "block_id"
+        self.objects[block_id] = {"object": "block", "id": block_id, "created_time": T, "last_edited_time": T,
+                                  "parent": {"type": parent_type, parent_type: parent_id}, "archived": False,
+                                  "has_children": children, "type": "paragraph",
+                                  "paragraph": {"rich_text": rich_text(text), "color": "default"}}
+        self.children[parent_id].append(self.objects[block_id])
+        self.children[block_id] = []
+        if self.objects[parent_id]["object"] == "block":
+            self.objects[parent_id]["has_children"] = True
+        return block_id
+
+    def fail(self, path_pattern: str, status: int, code: str, times: int = 1, after: int = 0) -> None:
+        """Answer the next `times` matching requests with an error, once `after` of them went through."""
+        self.errors.setdefault(path_pattern, []).extend([None] * after + [{"status": status, "code": code}] * times)
+
+    def _paginate(self, items: List[Dict], request: httpx.Request) -> Dict:
+        if request.method == "POST":
+            body = json.loads(request.content or b"{}")
+            cursor, page_size = body.get("start_cursor"), body.get("page_size")
+        else:
+            cursor, page_size = request.url.params.get("start_cursor"), request.url.params.get("page_size")
+        start = int(cursor) if cursor else 0
+        end = start + min(int(page_size or self.page_size), self.page_size)
+        more = end < len(items)
+        return {"object": "list", "results": items[start:end], "has_more": more,
+                "next_cursor": str(end) if more else None}
+
+    def _error(self, status: int, code: str) -> httpx.Response:
+        return httpx.Response(status, json={"object": "error", "status": status, "code": code, "message": code})
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.replace("/v1/", "")
+        self.calls[f"{request.method} {re.sub(r'[0-9a-f-]{36}', 'ID', path)}"] += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        token = request.headers.get("Authorization", "").replace("Bearer ", "")
+        self.token_calls[token] += 1
+        if any(notion_id in path for notion_id in self.hidden.get(token, ())):
+            return self._error(404, "object_not_found")
+        for pattern, errors in self.errors.items():
+            if re.search(pattern, path) and errors:
+                error = errors.pop(0)
+                if error is not None:
+                    return self._error(error["status"], error["code"])
+                break
+
+        match = re.fullmatch(r"(pages|blocks|databases)/([0-9a-f-]+)", path)
+        if match and request.method == "GET":
+            obj = self.objects.get(match.group(2))
+            if obj is None or obj["object"] != match.group(1)[:-1]:
+                return self._error(404, "object_not_found")
+            return httpx.Response(200, json=obj)
+        match = re.fullmatch(r"blocks/([0-9a-f-]+)/children", path)
+        if match and request.method == "GET":
+            return httpx.Response(200, json=self._paginate(self.children.get(match.group(1), []), request))
+        match = re.fullmatch(r"databases/([0-9a-f-]+)/query", path)
+        if match and request.method == "POST":
+            return httpx.Response(200, json=self._paginate(self.entries[match.group(1)], request))
+        if request.method in ("PATCH", "DELETE", "POST"):
+            return self._write(request.method, path, json.loads(request.content or b"{}"))
+        return self._error(400, "validation_error")
+
+    def _edited(self, obj: Dict) -> Dict:
+        # Every write moves last_edited_time forward, like Notion does
+        self.edits += 1
+        obj["last_edited_time"] = f"2024-01-02T00:00:{self.edits:02d}.000Z"
+        return obj
+
+    def _unlist(self, obj: Dict) -> None:
+        for items in list(self.children.values()) + list(self.entries.values()):
+            if obj in items:
+                items.remove(obj)
+
+    def _write(self, method: str, path: str, body: Dict) -> httpx.Response:
+        match = re.fullmatch(r"blocks/([0-9a-f-]+)/children", path)
+        if match and method == "PATCH":
+            parent_id, after = match.group(1), body.get("after")
+            results = []
+            for child in body.get("children", []):
+                block_id = self.block(parent_id, "")
+                block = self.objects[block_id]
+                self.children[parent_id].remove(block)
+                block.update(child, id=block_id, object="block")
+                siblings = self.children[parent_id]
+                position = next((i + 1 for i, item in enumerate(siblings) if item["id"] == after), len(siblings))
+                siblings.insert(position, block)
+                results.append(block)
+                after = block_id
+            return httpx.Response(200, json={"object": "list", "results": results, "has_more": False,
+                                             "next_cursor": None})
+        match = re.fullmatch(r"(pages|blocks)/([0-9a-f-]+)", path)
+        if match and method in ("PATCH", "DELETE"):
+            obj = self.objects.get(match.group(2))
+            if obj is None or obj["object"] != match.group(1)[:-1]:
+                return self._error(404, "object_not_found")
+            if method == "DELETE":
+                body = {"archived": True, "in_trash": True}
+            obj.update({key: value for key, value in body.items() if key != "properties"})
+            obj["properties"] = {**obj.get("properties", {}), **body.get("properties", {})}
+            if obj["object"] == "block":
+                del obj["properties"]
+            if obj.get("archived") or obj.get("in_trash"):
+                self._unlist(obj)
+            return httpx.Response(200, json=self._edited(obj))
+        if path == "pages" and method == "POST":
+            parent = body["parent"]
+            parent_type = "database_id" if "database_id" in parent else "page_id"
+            title = body.get("properties", {}).get("Name", {}).get("title", [{}])[0].get("plain_text", "")
+            if parent_type == "database_id":
+                page_id = self.entry(parent["database_id"], title, {})
+            else:
+                page_id = self.page(title, {"type": "page_id", "page_id": parent["page_id"]})
+            self.objects[page_id]["properties"].update(body.get("properties", {}))
+            return httpx.Response(200, json=self.objects[page_id])
+        return self._error(400, "validation_error")
+
+    def client(self, **kwargs) -> CachedClient:
+        kwargs.setdefault("cache", MemoryCache())
+        kwargs.setdefault("cache_delta", 24)
+        return CachedClient(client=httpx.Client(transport=httpx.MockTransport(self.handler)), auth="secret",
+                            log_level=logging.ERROR, **kwargs)
+
+    def total(self) -> int:
+        return sum(self.calls.values())
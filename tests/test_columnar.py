@@ -0,0 +1,38 @@
+import csv
+
+from cached_notion.columnar import export_database, iter_column_chunks
+from tests.fake_notion import FakeNotion
+
+
+def _database(entries: int = 5):
+    notion = FakeNotion()
+    root = notion.page("Root")
+    database_id = notion.database(root, {"Name": "title", "Num": "number"})
+    for i in range(entries):
+        notion.entry(database_id, f"Entry {i}", {"Num": {"id": "Num", "type": "number", "number": i}})
+    return notion, database_id
+
+
+def test_cached_entries_are_exported_without_requests(tmp_path):
+    notion, database_id = _database()
+    client = notion.client()
+    client.databases.retrieve(database_id)
+    client.databases.query_all(database_id)
+    calls = notion.total()
+
+    rows = export_database(client, database_id, str(tmp_path / "entries.csv"), chunk_size=2)
+
+    assert rows == 5
+    assert notion.total() == calls
+    with open(tmp_path / "entries.csv") as f:
+        assert [row["Num"] for row in csv.DictReader(f)] == ["0", "1", "2", "3", "4"]
+
+
+def test_uncached_entries_are_streamed_with_the_given_page_size():
+    notion, database_id = _database()
+    client = notion.client()
+
+    chunks = list(iter_column_chunks(client, database_id, chunk_size=2, page_size=50))
+
+    assert [chunk["Num"] for chunk in chunks] == [[0, 1], [2, 3], [4]]
+    assert notion.calls == {"GET databases/ID": 1, "POST databases/ID/query": 3}
@@ -0,0 +1,26 @@
+from cached_notion.journal import ChangeJournal
+from tests.fake_notion import FakeNotion
+
+
+def test_edits_and_removals_are_journaled_with_their_parent(tmp_path):
+    notion = FakeNotion()
+    root = notion.page("Root")
+    child = notion.page("Child", {"type": "page_id", "page_id": root})
+    journal = ChangeJournal(str(tmp_path / "journal.sqlite"))
+    client = notion.client(change_journal=journal)
+
+    client.pages.retrieve(child)
+    cached = client.cache.get(child)
+    client.cache.set(child, cached)
+    cached["last_edited_time"] = "2024-02-01T00:00:00.000Z"
+    client.cache.set(child, cached)
+    cached["archived"] = True
+    client.cache.set(child, cached)
+    client.cache.delete(root)
+
+    changes = journal.changes_since(0)
+    assert [(change["id"], change["parent_id"], change["deleted"]) for change in changes] == [
+        (child, root, False), (child, root, False), (child, root, True),
+    ]
+    assert journal.changes_since(changes[-1]["seq"]) == []
+    journal.close()
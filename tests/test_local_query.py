@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from cached_notion.local_query import UnsupportedFilterError
+from tests.fake_notion import FakeNotion, rich_text
+
+
+def _database():
+    notion = FakeNotion()
+    root = notion.page("Root")
+    database_id = notion.database(root, {"Name": "title", "Tags": "multi_select", "Due": "date", "Done": "checkbox"})
+    for i, (title, tags, due) in enumerate([("Apple pie", ["a"], "2024-01-01"), ("Banana", ["a", "b"], "2024-01-02"),
+                                            ("Apple tart", ["b"], "2024-01-01T10:00:00.000Z")]):
+        notion.entry(database_id, title, {
+            "Tags": {"id": "Tags", "type": "multi_select", "multi_select": [{"name": tag} for tag in tags]},
+            "Due": {"id": "Due", "type": "date", "date": {"start": due, "end": None}},
+            "Done": {"id": "Done", "type": "checkbox", "checkbox": i % 2 == 0},
+        })
+    return notion, database_id
+
+
+def _titles(entries):
+    return [entry["properties"]["Name"]["title"][0]["plain_text"] for entry in entries]
+
+
+def _cached_client(notion, database_id, **kwargs):
+    client = notion.client(**kwargs)
+    client.databases.retrieve(database_id)
+    client.databases.query_all(database_id)
+    return client
+
+
+def test_local_query_matches_the_api_semantics():
+    notion, database_id = _database()
+    client = _cached_client(notion, database_id)
+    client.databases.create_local_index(database_id, "Tags")
+    client.databases.create_local_index(database_id, "Done")
+    calls = notion.total()
+
+    title = client.databases.query_all(database_id, local=True,
+                                       filter={"property": "Name", "title": {"contains": "Apple"}})
+    due = client.databases.query_all(database_id, local=True,
+                                     filter={"property": "Due", "date": {"equals": "2024-01-01"}})
+    tags = client.databases.query_all(database_id, local=True, filter={"and": [
+        {"property": "Tags", "multi_select": {"contains": "a"}},
+        {"property": "Done", "checkbox": {"equals": False}},
+    ]})
+
+    assert _titles(title) == ["Apple pie", "Apple tart"]
+    assert _titles(due) == ["Apple pie", "Apple tart"]
+    assert _titles(tags) == ["Banana"]
+    assert notion.total() == calls
+
+
+def test_only_exact_value_properties_can_be_indexed():
+    notion, database_id = _database()
+    client = _cached_client(notion, database_id)
+
+    for name in ("Name", "Due"):
+        with pytest.raises(UnsupportedFilterError):
+            client.databases.create_local_index(database_id, name)
+
+
+def test_uncached_database_is_queried_through_the_api():
+    notion, database_id = _database()
+    client = notion.client()
+    query = {"filter": {"property": "Name", "title": {"contains": "Apple"}}, "page_size": 1}
+
+    client.databases.query_all(database_id, local=True, **query)
+
+    # page_size reached the API, one request per entry
+    assert notion.calls == {"POST databases/ID/query": 3}
+    assert client.cache.get(database_id) is None
+
+
+def test_in_memory_entries_expire_with_the_query_ttl():
+    notion, database_id = _database()
+    client = _cached_client(notion, database_id, query_cache_delta=timedelta(minutes=5))
+    query = {"filter": {"property": "Name", "title": {"contains": "Banana"}}}
+    assert _titles(client.databases.query_all(database_id, local=True, **query)) == ["Banana"]
+
+    notion.entries[database_id][0]["properties"]["Name"]["title"] = rich_text("Banana split")
+    cached = client.cache.get(database_id)
+    cached["entries_cached_time"] = (datetime.now() - timedelta(minutes=10)).isoformat()
+    client.cache.set(database_id, cached)
+    client.local_query._entries[database_id] = (cached["entries"], datetime.now() - timedelta(minutes=10), {})
+
+    assert _titles(client.databases.query_all(database_id, local=True, **query)) == ["Banana split", "Banana"]
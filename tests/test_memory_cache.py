@@ -0,0 +1,40 @@
+from cached_notion.cached_client import MemoryCache
+from cached_notion.utils import retrieve_all_content
+from tests.fake_notion import FakeNotion
+
+
+def test_values_are_copied_in_and_out():
+    cache = MemoryCache()
+    value = {"id": "a", "children": []}
+    cache.set("a", value)
+
+    value["children"].append("set")
+    cache.get("a")["children"].append("get")
+
+    assert cache.get("a") == {"id": "a", "children": []}
+
+
+def test_listeners_see_in_place_edits():
+    cache = MemoryCache()
+    seen = []
+    cache.add_listener(lambda notion_id, previous, value: seen.append((previous, value)))
+    cache.set("a", {"last_edited_time": "1"})
+
+    obj = cache.get("a")
+    obj["last_edited_time"] = "2"
+    cache.set("a", obj)
+
+    assert seen[-1] == ({"last_edited_time": "1"}, {"last_edited_time": "2"})
+
+
+def test_crawl_does_not_nest_subtrees_into_cached_listings():
+    notion = FakeNotion()
+    root = notion.page("Root")
+    parent = notion.block(root, "Parent")
+    notion.block(parent, "Child")
+    client = notion.client()
+
+    retrieve_all_content(client, root, "page")
+
+    assert "children" not in client.cache.get(root)["children"][0]
+    assert len(client.cache.get(parent)["children"]) == 1
@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from cached_notion.cached_api_endpoints import query_cache_key
+from tests.fake_notion import FakeNotion
+
+
+def _database(entries: int = 3):
+    notion = FakeNotion()
+    root = notion.page("Root")
+    database_id = notion.database(root, {"Name": "title", "Num": "number"})
+    for i in range(entries):
+        notion.entry(database_id, f"Entry {i}", {"Num": {"id": "Num", "type": "number", "number": i}})
+    return notion, database_id
+
+
+def test_unfiltered_query_is_stored_once_on_the_database():
+    notion, database_id = _database()
+    client = notion.client()
+    client.databases.retrieve(database_id)
+
+    entries = client.databases.query_all(database_id)
+
+    assert len(client.cache.get(database_id)["entries"]) == len(entries) == 3
+    assert client.cache.get(query_cache_key(database_id, {})) is None
+    calls = notion.total()
+    assert client.databases.query_all(database_id) == entries
+    assert notion.total() == calls
+
+
+def test_filtered_query_is_cached_per_params():
+    notion, database_id = _database()
+    client = notion.client()
+    query = {"filter": {"property": "Num", "number": {"greater_than": 0}}}
+
+    client.databases.query_all(database_id, **query)
+    calls = notion.total()
+    client.databases.query_all(database_id, **query)
+
+    assert notion.total() == calls
+    assert client.cache.get(query_cache_key(database_id)) == [query_cache_key(database_id, query)]
+
+
+def test_partial_entries_are_not_cached_as_pages():
+    notion, database_id = _database()
+    client = notion.client()
+
+    entries = client.databases.query_all(database_id, filter_properties=["title"])
+
+    assert all(client.cache.get(entry["id"]) is None for entry in entries)
+
+
+def test_concurrent_queries_keep_every_index_key():
+    notion, database_id = _database(entries=1)
+    client = notion.client()
+    queries = [{"filter": {"property": "Num", "number": {"equals": i}}} for i in range(40)]
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda query: client.databases.query_all(database_id, **query), queries))
+
+    assert len(client.cache.get(query_cache_key(database_id))) == len(queries)
+    client.databases.invalidate_queries(database_id)
+    assert all(client.cache.get(query_cache_key(database_id, query)) is None for query in queries)
+
+
+def test_unfiltered_entries_expire_with_the_query_ttl():
+    notion, database_id = _database()
+    client = notion.client(query_cache_delta=timedelta(minutes=5))
+    client.databases.retrieve(database_id)
+    client.databases.query_all(database_id)
+    cached = client.cache.get(database_id)
+    cached["entries_cached_time"] = (datetime.now() - timedelta(days=30)).isoformat()
+    client.cache.set(database_id, cached)
+    notion.calls.clear()
+
+    client.databases.query_all(database_id)
+
+    assert notion.calls == {"POST databases/ID/query": 2}
+    assert client.cache.get(database_id)["entries_cached_time"] > cached["entries_cached_time"]
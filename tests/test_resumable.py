@@ -0,0 +1,64 @@
+import pytest
+from notion_client.errors import APIResponseError
+
+from cached_notion.retry_policy import RetryPolicy
+from tests.fake_notion import FakeNotion
+
+QUERY = "databases/.*/query"
+
+
+def _interrupted(entries: int = 5):
+    # A query_all that failed on its second page, leaving a checkpoint behind
+    notion = FakeNotion()
+    root = notion.page("Root")
+    database_id = notion.database(root, {"Name": "title"})
+    for i in range(entries):
+        notion.entry(database_id, f"Entry {i}", {})
+    client = notion.client(retry_policy=RetryPolicy(min_wait=0, max_wait=0))
+    notion.fail(QUERY, 403, "restricted_resource", after=1)
+    with pytest.raises(APIResponseError):
+        client.databases.query_all(database_id)
+    notion.calls.clear()
+    return notion, client, database_id
+
+
+def test_resumes_from_the_checkpointed_cursor():
+    notion, client, database_id = _interrupted()
+
+    entries = client.databases.query_all(database_id)
+
+    assert [entry["id"] for entry in entries] == [entry["id"] for entry in notion.entries[database_id]]
+    assert notion.calls == {"POST databases/ID/query": 2}
+
+
+def test_rejected_checkpoint_restarts_once():
+    notion, client, database_id = _interrupted()
+    notion.fail(QUERY, 400, "validation_error")
+
+    entries = client.databases.query_all(database_id)
+
+    assert len(entries) == 5
+    assert notion.calls == {"POST databases/ID/query": 4}
+
+
+def test_rejected_restart_is_not_retried_forever():
+    notion, client, database_id = _interrupted()
+    notion.fail(QUERY, 400, "validation_error", times=100)
+
+    with pytest.raises(APIResponseError):
+        client.databases.query_all(database_id)
+    assert notion.calls == {"POST databases/ID/query": 2}
+
+
+def test_rejected_cursor_of_the_current_run_is_raised():
+    notion = FakeNotion()
+    root = notion.page("Root")
+    database_id = notion.database(root, {"Name": "title"})
+    for i in range(5):
+        notion.entry(database_id, f"Entry {i}", {})
+    client = notion.client()
+    notion.fail(QUERY, 400, "validation_error", times=100, after=1)
+
+    with pytest.raises(APIResponseError):
+        client.databases.query_all(database_id)
+    assert notion.calls == {"POST databases/ID/query": 2}
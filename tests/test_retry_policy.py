@@ -0,0 +1,53 @@
+import time
+
+import httpx
+import pytest
+from notion_client.errors import APIResponseError
+
+from cached_notion.retry_policy import RetryPolicy
+from cached_notion.utils import retrieve_object
+from tests.fake_notion import FakeNotion
+
+
+def _failing():
+    raise httpx.ConnectError("down")
+
+
+def test_wait_never_passes_the_deadline():
+    policy = RetryPolicy(max_attempts=100, default_deadline=0.3, min_wait=0.2, max_wait=0.2)
+    start = time.monotonic()
+    with pytest.raises(httpx.ConnectError):
+        policy.call("pages.retrieve", _failing)
+    assert time.monotonic() - start < 0.5
+
+
+def test_calls_can_share_one_deadline():
+    policy = RetryPolicy(max_attempts=100, default_deadline=0.3, min_wait=0.1, max_wait=0.1)
+    deadline_at = policy.deadline_at("blocks.children.list")
+    start = time.monotonic()
+    for _ in range(3):
+        with pytest.raises(httpx.ConnectError):
+            policy.call_until(deadline_at, "blocks.children.list", _failing)
+    assert time.monotonic() - start < 0.5
+
+
+def test_unknown_type_does_not_swallow_access_errors():
+    notion = FakeNotion()
+    page_id = notion.page("Root")
+    notion.fail("pages/", 403, "restricted_resource")
+    client = notion.client(retry_policy=RetryPolicy(min_wait=0, max_wait=0))
+
+    with pytest.raises(APIResponseError) as error:
+        retrieve_object(client, page_id)
+    assert error.value.code == "restricted_resource"
+    assert notion.calls == {"GET pages/ID": 1}
+
+
+def test_unknown_type_tries_every_endpoint_before_giving_up():
+    notion = FakeNotion()
+    client = notion.client()
+
+    with pytest.raises(Exception, match="Could not retrieve") as error:
+        retrieve_object(client, "00000000-0000-0000-0000-000000000000")
+    assert isinstance(error.value.__cause__, APIResponseError)
+    assert notion.total() == 3
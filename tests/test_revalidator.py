@@ -0,0 +1,72 @@
+import threading
+from datetime import datetime, timedelta
+
+from cached_notion.revalidator import Revalidator
+from tests.fake_notion import FakeNotion, rich_text
+
+
+def _stale_page(age: timedelta):
+    notion = FakeNotion()
+    page_id = notion.page("Old")
+    client = notion.client(stale_while_revalidate=True, cache_delta=1, stale_grace=1)
+    cached = client.pages.retrieve(page_id)
+    cached["cached_time"] = (datetime.now() - age).isoformat()
+    client.cache.set(page_id, cached)
+    notion.objects[page_id]["properties"]["Name"]["title"] = rich_text("New")
+    notion.objects[page_id]["last_edited_time"] = "2024-02-01T00:00:00.000Z"
+    notion.calls.clear()
+    return notion, client, page_id
+
+
+def _title(page):
+    return page["properties"]["Name"]["title"][0]["plain_text"]
+
+
+def test_stale_entry_is_served_and_refreshed_in_the_background():
+    notion, client, page_id = _stale_page(timedelta(minutes=90))
+    notion.gate = threading.Event()
+
+    assert _title(client.pages.retrieve(page_id)) == "Old"
+
+    notion.gate.set()
+    client.revalidator.shutdown()
+    assert notion.calls == {"GET pages/ID": 1}
+    assert _title(client.cache.get(page_id)) == "New"
+
+
+def test_one_refresh_per_id_is_in_flight():
+    notion, client, page_id = _stale_page(timedelta(minutes=90))
+    notion.gate = threading.Event()
+
+    for _ in range(5):
+        assert _title(client.pages.retrieve(page_id)) == "Old"
+    assert client.revalidator.is_refreshing(("pages", page_id))
+
+    notion.gate.set()
+    client.revalidator.shutdown()
+    assert notion.calls == {"GET pages/ID": 1}
+
+
+def test_entry_past_the_grace_window_is_fetched_synchronously():
+    notion, client, page_id = _stale_page(timedelta(hours=3))
+
+    assert _title(client.pages.retrieve(page_id)) == "New"
+    assert notion.calls == {"GET pages/ID": 1}
+    assert not client.revalidator.is_refreshing(("pages", page_id))
+
+
+def test_failed_refresh_frees_the_key():
+    revalidator = Revalidator(max_workers=1)
+    released = threading.Event()
+
+    def fail():
+        released.wait(5)
+        raise RuntimeError("down")
+
+    assert revalidator.submit("key", fail) is not None
+    assert revalidator.submit("key", fail) is None
+    released.set()
+    revalidator.shutdown()
+    assert not revalidator.is_refreshing("key")
+    assert revalidator.submit("key", lambda: "ok").result() == "ok"
+    revalidator.shutdown()
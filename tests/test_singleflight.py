@@ -0,0 +1,80 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from notion_client.errors import APIResponseError
+
+from cached_notion.singleflight import SingleFlight
+from tests.fake_notion import FakeNotion
+
+CALLERS = 8
+
+
+def _concurrently(notion: FakeNotion, client, func):
+    # Hold the leader's request until every caller has joined it
+    notion.gate = threading.Event()
+    with ThreadPoolExecutor(CALLERS) as executor:
+        futures = [executor.submit(func) for _ in range(CALLERS)]
+        deadline = time.monotonic() + 5
+        while sum(call.followers for call in list(client.single_flight._calls.values())) < CALLERS - 1:
+            assert time.monotonic() < deadline, "callers never joined the request in flight"
+            time.sleep(0.01)
+        notion.gate.set()
+    return futures
+
+
+def test_concurrent_retrieves_share_one_request():
+    notion = FakeNotion()
+    page_id = notion.page("Hub")
+    client = notion.client()
+
+    results = [future.result() for future in _concurrently(notion, client, lambda: client.pages.retrieve(page_id))]
+
+    assert notion.calls == {"GET pages/ID": 1}
+    assert all(result["id"] == page_id for result in results)
+    # Every caller got its own copy
+    assert len({id(result) for result in results}) == CALLERS
+    results[0]["properties"].clear()
+    assert results[1]["properties"]
+
+
+def test_concurrent_listings_share_one_request():
+    notion = FakeNotion()
+    page_id = notion.page("Hub")
+    for i in range(3):
+        notion.block(page_id, f"Block {i}")
+    client = notion.client()
+
+    futures = _concurrently(notion, client, lambda: client.blocks.children.list_all(page_id))
+
+    results = [future.result() for future in futures]
+    assert notion.calls == {"GET blocks/ID/children": 2}
+    assert all(len(result) == 3 for result in results)
+    assert len({id(result[0]) for result in results}) == CALLERS
+
+
+def test_leader_error_reaches_every_follower():
+    notion = FakeNotion()
+    page_id = notion.page("Hub")
+    notion.fail("pages/", 403, "restricted_resource")
+    client = notion.client()
+
+    for future in _concurrently(notion, client, lambda: client.pages.retrieve(page_id)):
+        with pytest.raises(APIResponseError):
+            future.result()
+    assert notion.calls == {"GET pages/ID": 1}
+    assert client.single_flight.in_flight() == 0
+
+
+def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+    started = threading.Barrier(2, timeout=5)
+
+    def call():
+        started.wait()
+        return "done"
+
+    with ThreadPoolExecutor(2) as executor:
+        futures = [executor.submit(flight.do, key, call) for key in ("a", "b")]
+    assert [future.result() for future in futures] == ["done", "done"]
@@ -0,0 +1,79 @@
+import pytest
+
+from cached_notion.cached_client import MemoryCache
+from cached_notion.snapshot import SnapshotCache, SnapshotError, export_snapshot, import_snapshot
+from cached_notion.utils import retrieve_all_content
+from tests.fake_notion import FakeNotion
+
+
+def _crawled():
+    notion = FakeNotion()
+    root = notion.page("Root")
+    blocks = [notion.block(root, f"Block {i}") for i in range(3)]
+    client = notion.client()
+    retrieve_all_content(client, root, "page")
+    return client.cache, root, blocks
+
+
+def test_export_keeps_listed_blocks_within_max_age(tmp_path):
+    cache, root, blocks = _crawled()
+    path = str(tmp_path / "cache.snap")
+
+    assert export_snapshot(cache, path, roots=[root], max_age=24) == 4
+
+    imported = MemoryCache()
+    assert import_snapshot(imported, path) == 4
+    assert dict(imported.items()) == {key: cache.get(key) for key in [root] + blocks}
+
+
+def test_import_keeps_the_newer_edit(tmp_path):
+    cache, root, blocks = _crawled()
+    path = str(tmp_path / "cache.snap")
+    export_snapshot(cache, path)
+
+    local = MemoryCache()
+    newer = dict(cache.get(blocks[0]), last_edited_time="2030-01-01T00:00:00.000Z")
+    older = dict(cache.get(blocks[1]), last_edited_time="2020-01-01T00:00:00.000Z")
+    local.set(blocks[0], newer)
+    local.set(blocks[1], older)
+
+    assert import_snapshot(local, path) == 3
+    assert local.get(blocks[0]) == newer
+    assert local.get(blocks[1]) == cache.get(blocks[1])
+
+
+def test_snapshot_cache_serves_the_file_and_writes_to_the_overlay(tmp_path):
+    cache, root, blocks = _crawled()
+    path = str(tmp_path / "cache.snap")
+    export_snapshot(cache, path)
+    snapshot = SnapshotCache(path)
+
+    try:
+        assert snapshot.get(root) == cache.get(root)
+        edited = dict(cache.get(blocks[0]), last_edited_time="2030-01-01T00:00:00.000Z")
+        snapshot.set(blocks[0], edited)
+        snapshot.delete(blocks[1])
+
+        assert snapshot.get(blocks[0]) == edited
+        assert snapshot.get(blocks[1]) is None
+        assert dict(snapshot.items()).keys() == {root, blocks[0], blocks[2]}
+        assert snapshot.overlay.get(root) is None
+    finally:
+        snapshot.close()
+
+
+def test_corrupted_snapshot_is_rejected(tmp_path):
+    cache, root, blocks = _crawled()
+    path = tmp_path / "cache.snap"
+    export_snapshot(cache, str(path))
+    data = bytearray(path.read_bytes())
+    data[20] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(SnapshotError, match="checksum"):
+        SnapshotCache(str(path))
+    with pytest.raises(SnapshotError, match="truncated"):
+        path.write_bytes(bytes(data[:-1]))
+        import_snapshot(MemoryCache(), str(path))
+    with pytest.raises(SnapshotError, match="not a snapshot"):
+        import_snapshot(MemoryCache(), __file__)
@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+
+# Imported on first use, never while importing the package or building a client
+_DEFERRED = ("tqdm", "pydantic", "cached_notion.models.property", "sqlitedict", "httpcore")
+
+_BASELINE = """
+import json, time
+start = time.perf_counter()
+import notion_client
+print(json.dumps({"seconds": time.perf_counter() - start, "loaded": []}))
+"""
+
+_STARTUP = """
+import json, sys, time
+start = time.perf_counter()
+import cached_notion.utils
+from cached_notion.cached_client import CachedClient
+CachedClient(auth="secret")
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "loaded": sorted(name for name in %r if name in sys.modules)}))
+""" % (_DEFERRED,)
+
+# Importing the deferred modules eagerly costs about three times a bare notion_client import on top of it
+_MAX_RATIO = 2.5
+
+
+def _run(script: str, cwd: str) -> dict:
+    # Best of three fresh interpreters, to keep scheduling noise out of the comparison
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.environ.get("PYTHONPATH", "")]))
+    runs = [json.loads(subprocess.run([sys.executable, "-c", script], cwd=cwd, env=env, capture_output=True,
+                                      text=True, check=True).stdout.splitlines()[-1]) for _ in range(3)]
+    return min(runs, key=lambda run: run["seconds"])
+
+
+def test_heavy_modules_are_imported_lazily(tmp_path):
+    baseline = _run(_BASELINE, str(tmp_path))
+    startup = _run(_STARTUP, str(tmp_path))
+
+    assert startup["loaded"] == []
+    assert startup["seconds"] <= _MAX_RATIO * baseline["seconds"], \
+        f"startup took {startup['seconds']:.3f}s, a bare notion_client import {baseline['seconds']:.3f}s"
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+from notion_client.errors import APIResponseError
+
+from cached_notion.token_pool import TokenPool, object_key
+from tests.fake_notion import FakeNotion
+
+
+def _pooled(tokens=("a", "b"), **kwargs):
+    notion = FakeNotion()
+    page_id = notion.page("Page")
+    client = notion.client(token_pool=TokenPool(tokens, rate=1000, **kwargs))
+    return notion, client, page_id
+
+
+def test_object_key():
+    assert object_key("databases/abc/query") == "abc"
+    assert object_key("/pages/abc/properties/title") == "abc"
+    assert object_key("search") is None
+
+
+def test_denied_token_is_skipped_for_that_object():
+    notion, client, page_id = _pooled()
+    notion.hidden["a"] = {page_id}
+
+    for _ in range(3):
+        assert client.pages.retrieve(page_id)["id"] == page_id
+
+    assert notion.token_calls == {"a": 1, "b": 3}
+    assert client.token_pool.snapshot()["...a"]["denied"] == 1
+
+
+def test_denials_are_remembered_for_a_bounded_number_of_objects():
+    notion, client, page_id = _pooled(remember_denials=1)
+    other_id = notion.page("Other")
+    notion.hidden["a"] = {page_id, other_id}
+
+    client.pages.retrieve(page_id)
+    client.pages.retrieve(other_id)
+    client.pages.retrieve(page_id)
+
+    # Remembering other_id pushed page_id out, so "a" was asked again
+    assert notion.token_calls == {"a": 3, "b": 3}
+
+
+def test_object_no_token_can_see_raises_and_is_retried_later():
+    notion, client, page_id = _pooled()
+    notion.hidden = {"a": {page_id}, "b": {page_id}}
+
+    with pytest.raises(APIResponseError):
+        client.pages.retrieve(page_id)
+    notion.hidden = {}
+
+    assert client.pages.retrieve(page_id)["id"] == page_id
+
+
+def test_rate_limited_token_is_rested_while_another_takes_over():
+    notion, client, page_id = _pooled()
+    notion.fail("pages/", 429, "rate_limited")
+
+    assert client.pages.retrieve(page_id)["id"] == page_id
+    assert notion.token_calls == {"a": 1, "b": 1}
+    assert client.token_pool.snapshot()["...a"]["rate_limited"] == 1
+    assert client.token_pool.acquire() == "b"
+
+
+def test_requests_are_spaced_by_the_rate_after_a_burst():
+    pool = TokenPool(["a"], rate=20, burst=2)
+
+    start = time.monotonic()
+    sent = []
+    for _ in range(6):
+        pool.acquire()
+        sent.append(time.monotonic() - start)
+
+    # Two requests go at once, the other four 50 ms apart
+    assert sent[1] < 0.03
+    assert 0.19 <= sent[-1] < 0.3
+    assert all(later - earlier >= 0.04 for earlier, later in zip(sent[2:], sent[3:]))
+
+
+def test_requests_alternate_between_tokens():
+    pool = TokenPool(["a", "b"], rate=10, burst=1)
+
+    assert [pool.acquire() for _ in range(4)] == ["a", "b", "a", "b"]
@@ -0,0 +1,77 @@
+import logging
+
+import httpx
+import pytest
+
+from cached_notion.cached_client import CachedClient, MemoryCache
+from cached_notion.transport import HTTPOptions, endpoint_name, request_timeout
+
+
+@pytest.mark.parametrize("method, path, name", [
+    ("GET", "blocks/abc/children", "blocks.children.list"),
+    ("PATCH", "blocks/abc/children", "blocks.children.append"),
+    ("POST", "databases/abc/query", "databases.query"),
+    ("GET", "pages/abc/properties/title", "pages.properties.retrieve"),
+    ("GET", "pages/abc", "pages.retrieve"),
+    ("GET", "/databases/abc/", "databases.retrieve"),
+    ("PATCH", "blocks/abc", "blocks.update"),
+    ("DELETE", "blocks/abc", "blocks.delete"),
+    ("POST", "pages", "pages.create"),
+    ("POST", "search", "search"),
+    ("GET", "users", "GET users"),
+])
+def test_endpoint_name(method, path, name):
+    assert endpoint_name(method, path) == name
+
+
+def test_request_timeout_per_endpoint():
+    options = HTTPOptions(connect_timeout=5, timeouts={"databases.query": 120, "pages.retrieve": 2})
+
+    assert request_timeout(options, 60, "POST", "databases/abc/query").as_dict()["read"] == 120
+    assert request_timeout(options, 60, "GET", "blocks/abc/children").as_dict()["read"] == 60
+    # The connect timeout never exceeds the read timeout
+    assert request_timeout(options, 60, "GET", "pages/abc").as_dict() == \
+        {"connect": 2, "read": 2, "write": 2, "pool": 2}
+
+
+def _client(**kwargs) -> CachedClient:
+    return CachedClient(auth="secret", cache=MemoryCache(), log_level=logging.ERROR, **kwargs)
+
+
+def test_requests_carry_their_endpoint_timeout():
+    client = _client(http_options=HTTPOptions(timeouts={"databases.query": 120}), timeout_ms=30_000)
+
+    query = client._build_request("POST", "databases/abc/query")
+    retrieve = client._build_request("GET", "pages/abc")
+
+    assert query.extensions["timeout"]["read"] == 120
+    assert retrieve.extensions["timeout"]["read"] == 30
+
+
+def test_http_client_is_built_on_first_use():
+    client = _client(http_options=HTTPOptions(max_connections=7, max_keepalive_connections=3))
+    assert client._clients == []
+
+    pool = client.client._transport._pool
+    assert (pool._max_connections, pool._max_keepalive_connections) == (7, 3)
+    assert client.client is client._clients[-1]
+    assert str(client.client.base_url).endswith("/v1/")
+    client.close()
+
+
+def test_given_http_client_is_used_as_is():
+    http_client = httpx.Client()
+    client = _client(client=http_client)
+
+    assert client.client is http_client
+    client.close()
+
+
+def test_context_manager_uses_a_tuned_client():
+    client = _client(http_options=HTTPOptions(max_connections=5))
+
+    with client as entered:
+        assert entered is client
+        assert client.client._transport._pool._max_connections == 5
+        assert client.client.headers["Authorization"] == "Bearer secret"
+    assert client._clients == []
@@ -0,0 +1,35 @@
+import pytest
+
+from cached_notion.utils import retrieve_all_content
+from tests.fake_notion import FakeNotion
+
+
+def _workspace() -> FakeNotion:
+    # 20 root blocks, 10 sub pages of 20 blocks, a database of 30 entries with 2 blocks each
+    notion = FakeNotion(page_size=100)
+    notion.root = notion.page("Root")
+    database_id = notion.database(notion.root, {"Name": "title", "Num": "number"})
+    for i in range(30):
+        entry_id = notion.entry(database_id, f"Entry {i}", {"Num": {"id": "Num", "type": "number", "number": i}})
+        for j in range(2):
+            notion.block(entry_id, f"Entry {i} paragraph {j}")
+    for i in range(10):
+        page_id = notion.page(f"Sub {i}", {"type": "page_id", "page_id": notion.root})
+        blocks = [notion.block(page_id, f"Sub {i} paragraph {j}") for j in range(20)]
+        notion.block(blocks[-1], "Nested")
+    for j in range(20):
+        notion.block(notion.root, f"Root paragraph {j}")
+    return notion
+
+
+@pytest.mark.parametrize("trust_listings, cold, repeated", [(False, 83, 31), (True, 53, 0)])
+def test_api_calls_of_a_crawl(trust_listings, cold, repeated):
+    notion = _workspace()
+    client = notion.client(trust_listings=trust_listings)
+
+    retrieve_all_content(client, notion.root, "page")
+    assert notion.total() == cold
+
+    notion.calls.clear()
+    retrieve_all_content(client, notion.root, "page")
+    assert notion.total() == repeated
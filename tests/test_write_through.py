@@ -0,0 +1,136 @@
+from cached_notion.cached_api_endpoints import query_cache_key
+from tests.fake_notion import FakeNotion, rich_text
+
+QUERY = {"filter": {"property": "Num", "number": {"equals": 1}}}
+
+
+def _paragraph(text: str):
+    return {"type": "paragraph", "paragraph": {"rich_text": rich_text(text), "color": "default"}}
+
+
+def _ids(items):
+    return [item["id"] for item in items]
+
+
+def _workspace():
+    notion = FakeNotion()
+    root = notion.page("Root")
+    blocks = [notion.block(root, f"Block {i}") for i in range(3)]
+    database_id = notion.database(root, {"Name": "title", "Num": "number"})
+    entries = [notion.entry(database_id, f"Entry {i}", {"Num": {"id": "Num", "type": "number", "number": i}})
+               for i in range(2)]
+    client = notion.client()
+    client.pages.retrieve(root)
+    client.blocks.children.list_all(root)
+    client.databases.retrieve(database_id)
+    client.databases.query_all(database_id)
+    client.databases.query_all(database_id, **QUERY)
+    notion.calls.clear()
+    return notion, client, root, blocks, database_id, entries
+
+
+def test_page_update_replaces_the_cached_entry_and_drops_queries():
+    notion, client, root, blocks, database_id, entries = _workspace()
+    client.cache.set(entries[0], dict(client.cache.get(entries[0]) or {}, children=[], children_completed=True))
+
+    client.pages.update(entries[0], properties={"Num": {"id": "Num", "type": "number", "number": 5}})
+
+    cached_entries = client.databases.query_all(database_id)
+    assert cached_entries[0]["properties"]["Num"]["number"] == 5
+    assert client.cache.get(entries[0])["properties"]["Num"]["number"] == 5
+    # Children cached for the page survive the write
+    assert client.cache.get(entries[0])["children_completed"]
+    assert client.cache.get(query_cache_key(database_id, QUERY)) is None
+    assert notion.calls == {"PATCH pages/ID": 1}
+
+
+def test_archived_entry_leaves_the_cached_entries():
+    notion, client, root, blocks, database_id, entries = _workspace()
+
+    client.pages.update(entries[0], archived=True)
+
+    assert _ids(client.databases.query_all(database_id)) == [entries[1]]
+    assert notion.calls == {"PATCH pages/ID": 1}
+
+
+def test_created_entry_joins_the_cached_entries():
+    notion, client, root, blocks, database_id, entries = _workspace()
+
+    page = client.pages.create(parent={"database_id": database_id}, properties={})
+
+    assert _ids(client.databases.query_all(database_id)) == entries + [page["id"]]
+    assert client.cache.get(page["id"])["id"] == page["id"]
+    assert notion.calls == {"POST pages": 1}
+
+
+def test_created_subpage_invalidates_the_parent_listing():
+    notion, client, root, blocks, database_id, entries = _workspace()
+
+    page = client.pages.create(parent={"page_id": root}, properties={})
+
+    assert page["id"] in _ids(client.blocks.children.list_all(root))
+    assert notion.calls == {"POST pages": 1, "GET blocks/ID/children": 3}
+
+
+def test_appended_blocks_are_inserted_after_the_given_block():
+    notion, client, root, blocks, database_id, entries = _workspace()
+
+    resp = client.blocks.children.append(root, children=[_paragraph("x"), _paragraph("y")], after=blocks[0])
+
+    new = _ids(resp["results"])
+    assert _ids(client.blocks.children.list_all(root))[:4] == [blocks[0]] + new + [blocks[1]]
+    assert all(client.cache.get(block_id) for block_id in new)
+    assert notion.calls == {"PATCH blocks/ID/children": 1}
+
+
+def test_append_marks_a_cached_block_as_having_children():
+    notion, client, root, blocks, database_id, entries = _workspace()
+    client.blocks.retrieve(blocks[0])
+    assert not client.cache.get(blocks[0])["has_children"]
+
+    client.blocks.children.append(blocks[0], children=[_paragraph("x")])
+
+    assert client.cache.get(blocks[0])["has_children"]
+
+
+def test_block_update_keeps_its_place_and_children():
+    notion, client, root, blocks, database_id, entries = _workspace()
+    child = notion.block(blocks[1], "Child")
+    client.blocks.retrieve(blocks[1])
+    client.blocks.children.list_all(blocks[1])
+
+    client.blocks.update(blocks[1], paragraph={"rich_text": rich_text("Edited"), "color": "default"})
+
+    listed = client.blocks.children.list_all(root)
+    assert _ids(listed)[:3] == blocks
+    assert listed[1]["paragraph"]["rich_text"][0]["plain_text"] == "Edited"
+    assert _ids(client.cache.get(blocks[1])["children"]) == [child]
+
+
+def test_deleting_the_last_child_clears_has_children():
+    notion, client, root, blocks, database_id, entries = _workspace()
+    child = notion.block(blocks[1], "Child")
+    client.blocks.retrieve(blocks[1])
+    client.blocks.children.list_all(blocks[1])
+    notion.calls.clear()
+
+    client.blocks.delete(child)
+    client.blocks.delete(blocks[0])
+
+    assert client.blocks.children.list_all(blocks[1]) == []
+    assert not client.cache.get(blocks[1])["has_children"]
+    assert blocks[0] not in _ids(client.blocks.children.list_all(root))
+    assert client.cache.get(blocks[0])["in_trash"]
+    assert notion.calls == {"DELETE blocks/ID": 2}
+
+
+def test_writes_under_an_uncached_parent_only_cache_the_object():
+    notion = FakeNotion()
+    root = notion.page("Root")
+    block_id = notion.block(root, "Block")
+    client = notion.client()
+
+    client.blocks.update(block_id, paragraph={"rich_text": rich_text("Edited"), "color": "default"})
+
+    assert client.cache.get(root) is None
+    assert client.cache.get(block_id)["paragraph"]["rich_text"][0]["plain_text"] == "Edited"